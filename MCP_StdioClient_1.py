@@ -1,56 +1,167 @@
 # mcp_client_module.py
 import asyncio
 import os
-import json
+import time
 from typing import Optional, Dict, List, Any
-from contextlib import AsyncExitStack
+from contextlib import AsyncExitStack, asynccontextmanager
+from urllib.parse import urlparse
+import anyio
 from mcp import ClientSession, StdioServerParameters
+import mcp.types as types
+from mcp.client.sse import sse_client
 from mcp.client.stdio import stdio_client
-import logging
 
-# 配置日志记录
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
+from common.async_context import BackgroundContext
+from common.logger import get_logger, truncate_for_log
+from common.result_cache import ToolResultCache, canonical_arguments
+from common.session_pool import SessionPool
+from common.tool_registry import ToolRegistry
+from common.tool_retriever import ToolRetriever
+from common.tracing import tracer
+
+# 日志统一写入 common.logger 的后台队列
+logger = get_logger(__name__)
+
+# 单个server启动的默认超时时间(秒)
+DEFAULT_STARTUP_TIMEOUT = 30
+# 单个server同时执行的工具调用数量上限
+DEFAULT_MAX_CONCURRENCY_PER_SERVER = 4
+# 每个远程(SSE / streamable HTTP) server 保持的会话数量
+DEFAULT_SESSIONS_PER_REMOTE_SERVER = int(os.getenv("MCP_REMOTE_SESSIONS", "4"))
+# 表示会话连接已断开、需要从会话池移除并重新打开的异常
+CONNECTION_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream, ConnectionError)
+
+
+def is_remote_server(server: str) -> bool:
+    """servers 配置中以 http:// 或 https:// 开头的是已运行的远程 server"""
+    return server.startswith(("http://", "https://"))
+
+
+def remote_transport(url: str):
+    """按地址选择远程 transport，返回创建连接的函数：路径以 /sse 结尾时使用 SSE，否则使用 streamable HTTP"""
+    if urlparse(url).path.rstrip("/").endswith("/sse"):
+        return lambda: sse_client(url)
+    try:
+        from mcp.client.streamable_http import streamablehttp_client
+    except ImportError:
+        raise ValueError(f"当前安装的 mcp 不支持 streamable HTTP(需要 mcp>=1.8)，请升级或使用 /sse 地址: {url}")
+    return lambda: streamablehttp_client(url)
+
+
+def tool_error_result(message: str) -> types.CallToolResult:
+    """构造一个表示调用失败的工具结果，供模型据此修正参数"""
+    return types.CallToolResult(content=[types.TextContent(type="text", text=message)], isError=True)
 
 
 class MCPClient:
-    def __init__(self):
-        """初始化 MCP 客户端"""
+    def __init__(self, max_concurrency_per_server: int = DEFAULT_MAX_CONCURRENCY_PER_SERVER,
+                 cache_ttls: Optional[Dict[str, float]] = None, cache_max_entries: int = 256,
+                 sessions_per_remote_server: int = DEFAULT_SESSIONS_PER_REMOTE_SERVER):
+        """初始化 MCP 客户端
+
+        Args:
+            max_concurrency_per_server (int): 单个server(远程server为每个存活的会话)同时执行的工具调用数量上限
+            cache_ttls (dict): 需要缓存结果的幂等工具 'server_name-tool_name' -> 缓存有效期(秒)
+            cache_max_entries (int): 结果缓存的最大条目数
+            sessions_per_remote_server (int): 每个远程server保持的会话数量，工具调用分散到各会话
+        """
         self.exit_stack = AsyncExitStack()
         self.sessions: Dict[str, ClientSession] = {}
+        self.pools: Dict[str, SessionPool] = {}
+        self.sessions_per_remote_server = max(1, sessions_per_remote_server)
         self.tool_by_session: Dict[str, list] = {}
+        self.tools = ToolRegistry()
+        self.tool_retriever: Optional[ToolRetriever] = None
         self.all_tools: List[Dict[str, Any]] = []
+        self.startup_report: Dict[str, Dict[str, Any]] = {}
+        self.max_concurrency_per_server = max_concurrency_per_server
+        self.server_files: Dict[str, str] = {}
+        self.connections: Dict[int, BackgroundContext] = {}
+        self.reconnect_locks: Dict[str, asyncio.Lock] = {}
+        self.result_cache = ToolResultCache(cache_ttls, max_entries=cache_max_entries)
+
+    async def connect_to_servers(self, servers: dict, startup_timeout: float = DEFAULT_STARTUP_TIMEOUT):
+        """同时启动多个server并获取工具
 
-    async def connect_to_servers(self, servers: dict):
-        """同时启动多个server并获取工具"""
-        for server_name, server_file in servers.items():
+        Args:
+            servers (dict): server名称 -> 脚本路径(.py/.js，通过 stdio 启动)或远程server地址(http(s)://...)
+            startup_timeout (float): 单个server启动(含initialize与list_tools)的超时时间(秒)
+        """
+        results = await asyncio.gather(*[
+            self._start_server(server_name, server_file, startup_timeout)
+            for server_name, server_file in servers.items()
+        ])
+
+        # 按配置顺序组装工具列表，与server完成先后无关
+        for server_name, (pool, tools, elapsed, error) in zip(servers, results):
+            self.startup_report[server_name] = {
+                "status": "ok" if error is None else error,
+                "elapsed": round(elapsed, 3),
+                "tools": len(tools),
+                "sessions": len(pool) if pool is not None else 0,
+            }
+            if pool is None:
+                continue
             try:
-                session = await self.connect_to_server(server_file)
-                logger.info(f"⭕ - {server_name}: {servers[server_name]}")
-                self.sessions[server_name] = session
-                session_tools = await session.list_tools()
-                self.tool_by_session[server_name] = session_tools.tools
-                for tool in session_tools.tools:
-                    function_name = f"{server_name}-{tool.name}"
-                    self.all_tools.append({
-                        "type": "function",
-                        "function": {
-                            "name": function_name,
-                            "description": tool.description,
-                            "parameters": tool.inputSchema,
-                            "required": list(tool.inputSchema.keys()) if tool.inputSchema else []
-                        }
-                    })
-            except Exception as e:
-                logger.error(f"❌ - 连接到 {server_name} 失败: {str(e)}")
+                registered = self.tools.register(server_name, tools)
+            except ValueError as e:
+                logger.error(f"❌ - {server_name} 工具注册失败: {e}")
+                self.startup_report[server_name]["status"] = "error"
                 continue
+            self.sessions[server_name] = pool.sessions[0]
+            self.pools[server_name] = pool
+            self.server_files[server_name] = servers[server_name]
+            self.reconnect_locks[server_name] = asyncio.Lock()
+            self.tool_by_session[server_name] = tools
+            self.all_tools.extend(entry.to_openai_tool() for entry in registered)
+        self.tool_retriever = ToolRetriever(self.tools)
+
+        logger.info("\n启动耗时报告：")
+        for server_name, report in self.startup_report.items():
+            logger.info(f" - {server_name}: {report['status']}, {report['elapsed']}s, {report['tools']} tools")
 
         logger.info("\n所有可用工具信息：")
         for tool in self.all_tools:
             logger.info(f" - {tool['function']['name']}: {tool['function']['description']}")
 
+    async def _start_server(self, server_name: str, server_file: str, startup_timeout: float):
+        """启动单个server并获取工具，返回 (会话池, tools, 耗时, 错误信息)"""
+        start = time.perf_counter()
+        with tracer.span("mcp.server.start", server=server_name) as span:
+            try:
+                pool, tools = await asyncio.wait_for(self._connect_and_list(server_name, server_file), timeout=startup_timeout)
+                logger.info(f"⭕ - {server_name}: {server_file}")
+                span.set(tools=len(tools), sessions=len(pool))
+                return pool, tools, time.perf_counter() - start, None
+            except asyncio.TimeoutError:
+                logger.error(f"❌ - 连接到 {server_name} 超时: {startup_timeout}s")
+                span.set(error="timeout")
+                return None, [], time.perf_counter() - start, "timeout"
+            except Exception as e:
+                logger.error(f"❌ - 连接到 {server_name} 失败: {str(e)}")
+                span.set(error=type(e).__name__)
+                return None, [], time.perf_counter() - start, "error"
+
+    async def _connect_and_list(self, server_name: str, server_file: str):
+        # 本地脚本只启动一个进程；远程server同时建立多个会话，部分会话失败时使用其余会话
+        count = self.sessions_per_remote_server if is_remote_server(server_file) else 1
+        with tracer.span("mcp.server.spawn_initialize", server=server_name, sessions=count):
+            results = await asyncio.gather(*[self.connect_to_server(server_file) for _ in range(count)],
+                                           return_exceptions=True)
+        sessions = [result for result in results if not isinstance(result, BaseException)]
+        if not sessions:
+            raise results[0]
+        if len(sessions) < count:
+            logger.warning(f"⚠️ {server_name} 只建立了 {len(sessions)}/{count} 个会话")
+        with tracer.span("mcp.list_tools", server=server_name):
+            session_tools = await sessions[0].list_tools()
+        return SessionPool(sessions, self.max_concurrency_per_server), session_tools.tools
+
     async def connect_to_server(self, server_script_path: str):
-        """连接到 MCP 服务器"""
+        """连接到 MCP 服务器：.py/.js 脚本通过 stdio 启动，http(s) 地址通过 SSE 或 streamable HTTP 连接"""
+        if is_remote_server(server_script_path):
+            return await self._open_session(server_script_path, remote_transport(server_script_path))
+
         is_python = server_script_path.endswith('.py')
         is_js = server_script_path.endswith('.js')
         if not (is_python or is_js):
@@ -62,38 +173,89 @@ class MCPClient:
             args=[server_script_path],
             env=None
         )
+        return await self._open_session(server_script_path, lambda: stdio_client(server_params))
+
+    async def _open_session(self, server: str, transport_factory):
+        @asynccontextmanager
+        async def open_session():
+            # streamable HTTP 额外返回获取会话 ID 的函数，只使用前两项读写流
+            async with transport_factory() as streams:
+                async with ClientSession(streams[0], streams[1]) as session:
+                    await session.initialize()
+                    yield session
+
+        # 连接在独立任务中打开，便于并发启动，并由 exit_stack 统一关闭
+        connection = BackgroundContext(open_session)
         try:
-            stdio_transport = await self.exit_stack.enter_async_context(
-                stdio_client(server_params)
-            )
-            read_stream, write_stream = stdio_transport
-            session = await self.exit_stack.enter_async_context(
-                ClientSession(read_stream, write_stream)
-            )
-            await session.initialize()
-            return session
+            session = await connection.start()
         except Exception as e:
-            logger.error(f"⚠️ 连接服务器 {server_script_path} 失败: {e}")
+            logger.error(f"⚠️ 连接服务器 {server} 失败: {e}")
             raise
+        self.exit_stack.push_async_callback(connection.stop)
+        self.connections[id(session)] = connection
+        return session
+
+    async def _replace_session(self, server_name: str, session: ClientSession):
+        """从会话池中移除连接已断开的会话并重新打开一个；同一会话的并发失败调用只会触发一次重连"""
+        pool = self.pools[server_name]
+        if await pool.remove(session):
+            connection = self.connections.pop(id(session), None)
+            if connection is not None:
+                await connection.stop()
+        async with self.reconnect_locks[server_name]:
+            # 其他调用已补足会话数量时不再重连
+            target = self.sessions_per_remote_server if is_remote_server(self.server_files[server_name]) else 1
+            if len(pool) >= target:
+                return
+            logger.warning(f"🔄 与 {server_name} 的会话已断开，正在重新连接({len(pool)}/{target} 个会话可用)")
+            await pool.add(await self.connect_to_server(self.server_files[server_name]))
+        self.sessions[server_name] = pool.sessions[0]
 
     async def call_mcp_tool(self, tool_full_name: str, tool_args: dict) -> Optional[Any]:
         """根据工具名称和参数调用 MCP 工具，并处理错误"""
-        parts = tool_full_name.split("-")
-        if len(parts) != 2:
-            logger.warning(f"⚠️ 工具名称格式错误: {tool_full_name}，应为 'server_name-tool_name'")
-            return None
-        server_name, tool_name = parts
-        session = self.sessions.get(server_name)
-        if session is None:
-            logger.warning(f"⚠️ 未连接到服务器 {server_name} 来执行工具 {tool_full_name}")
+        entry = self.tools.get(tool_full_name)
+        if entry is None:
+            logger.warning(f"⚠️ 未找到工具 {tool_full_name}，应为已连接server提供的 'server_name-tool_name'")
             return None
-        if server_name not in self.tool_by_session or tool_name not in [_.name for _ in self.tool_by_session[server_name]]:
-            logger.warning(f"⚠️ 服务器 {server_name} 不支持工具 {tool_name}")
-            return None
-        logger.info(f"正在调用工具 {tool_full_name}，参数: {tool_args}")
+        server_name, tool_name = entry.server_name, entry.tool.name
+        # 参数在本地按 inputSchema 校验，错误直接返回给模型，无需请求server
+        error = entry.validate(tool_args)
+        if error:
+            logger.warning(f"⚠️ 工具 {tool_full_name} 参数校验失败: {error}")
+            return tool_error_result(f"参数校验失败: {error}")
+        # 命中缓存的调用没有 mcp.tool.execute 子 span
+        with tracer.span("mcp.tool_call", tool=tool_full_name):
+            if not self.result_cache.is_cacheable(tool_full_name):
+                return await self._invoke_tool(tool_full_name, server_name, tool_name, tool_args)
+            # 对配置了缓存的工具，相同参数的调用共享缓存结果及正在执行的请求
+            key = (server_name, tool_name, canonical_arguments(tool_args))
+            return await self.result_cache.get_or_call(
+                tool_full_name, key,
+                lambda: self._invoke_tool(tool_full_name, server_name, tool_name, tool_args),
+                should_store=lambda result: result is not None and not result.isError
+            )
+
+    async def _invoke_tool(self, tool_full_name: str, server_name: str, tool_name: str, tool_args: dict):
+        logger.info(f"正在调用工具 {tool_full_name}，参数: {truncate_for_log(tool_args)}")
+        pool = self.pools[server_name]
         try:
-            resp = await session.call_tool(tool_name, tool_args)
-            return resp
+            # 会话连接断开时将其替换后重试一次
+            for attempt in range(2):
+                session = None
+                try:
+                    wait_start = time.time_ns()
+                    # 并发上限按会话池中存活的会话数计算；调用分散到当前最空闲的会话
+                    async with pool.acquire() as session:
+                        # 区分等待并发名额的时间与实际执行时间
+                        tracer.record("mcp.tool.queue_wait", wait_start, time.time_ns(), server=server_name, tool=tool_name)
+                        with tracer.span("mcp.tool.execute", server=server_name, tool=tool_name) as span:
+                            resp = await session.call_tool(tool_name, tool_args)
+                            span.set(is_error=resp.isError)
+                    return resp
+                except CONNECTION_ERRORS:
+                    if attempt:
+                        raise
+                    await self._replace_session(server_name, session)
         except Exception as e:
             logger.error(f"⚠️ 调用工具 {tool_full_name} 失败: {e}")
             return None
@@ -1,57 +1,135 @@
 # mcp_client_module.py
 import asyncio
-import os
-import json
+import time
 from typing import Optional, Dict, List, Any
 from contextlib import AsyncExitStack
-import logging
+
+import anyio
+import mcp.types as types
 from fastmcp import Client
 
-# 配置日志记录
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
+from common.async_context import BackgroundContext
+from common.logger import get_logger, truncate_for_log
+from common.result_cache import ToolResultCache, canonical_arguments
+from common.tool_registry import ToolRegistry
+from common.tool_retriever import ToolRetriever
+from common.tracing import tracer
+
+# 日志统一写入 common.logger 的后台队列
+logger = get_logger(__name__)
+
+# 单个server启动的默认超时时间(秒)
+DEFAULT_STARTUP_TIMEOUT = 30
+# 单个server同时执行的工具调用数量上限
+DEFAULT_MAX_CONCURRENCY_PER_SERVER = 4
+# 表示server连接已断开、需要重连的异常
+CONNECTION_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream, ConnectionError)
+
+
+def tool_error_result(message: str) -> types.CallToolResult:
+    """构造一个表示调用失败的工具结果，供模型据此修正参数"""
+    return types.CallToolResult(content=[types.TextContent(type="text", text=message)], isError=True)
 
 
 class MCPClient:
-    def __init__(self):
-        """初始化 MCP 客户端"""
+    def __init__(self, max_concurrency_per_server: int = DEFAULT_MAX_CONCURRENCY_PER_SERVER,
+                 cache_ttls: Optional[Dict[str, float]] = None, cache_max_entries: int = 256):
+        """初始化 MCP 客户端
+
+        Args:
+            max_concurrency_per_server (int): 单个server同时执行的工具调用数量上限
+            cache_ttls (dict): 需要缓存结果的幂等工具 'server_name-tool_name' -> 缓存有效期(秒)
+            cache_max_entries (int): 结果缓存的最大条目数
+        """
         self.exit_stack = AsyncExitStack()
         self.sessions: Dict[str, Client] = {}
         self.tool_by_session: Dict[str, list] = {}
+        self.tools = ToolRegistry()
+        self.tool_retriever: Optional[ToolRetriever] = None
         self.all_tools: List[Dict[str, Any]] = []
+        self.startup_report: Dict[str, Dict[str, Any]] = {}
+        self.max_concurrency_per_server = max_concurrency_per_server
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.result_cache = ToolResultCache(cache_ttls, max_entries=cache_max_entries)
+        self.connections: Dict[str, BackgroundContext] = {}
+        self.reconnect_locks: Dict[str, asyncio.Lock] = {}
+        self.generations: Dict[str, int] = {}
 
-    async def connect_to_servers(self, servers: dict):
-        """同时启动多个server并获取工具"""
-        for server_name, server_file in servers.items():
+    async def connect_to_servers(self, servers: dict, startup_timeout: float = DEFAULT_STARTUP_TIMEOUT):
+        """同时启动多个server并获取工具
+
+        Args:
+            servers (dict): server名称 -> 脚本路径
+            startup_timeout (float): 单个server启动(含list_tools)的超时时间(秒)
+        """
+        results = await asyncio.gather(*[
+            self._start_server(server_name, server_file, startup_timeout)
+            for server_name, server_file in servers.items()
+        ])
+
+        # 按配置顺序组装工具列表，与server完成先后无关
+        for server_name, (session, tools, elapsed, error) in zip(servers, results):
+            self.startup_report[server_name] = {
+                "status": "ok" if error is None else error,
+                "elapsed": round(elapsed, 3),
+                "tools": len(tools),
+            }
+            if session is None:
+                continue
             try:
-                session = await self.connect_to_server(server_file)
-                logger.info(f"⭕ - {server_name}: {servers[server_name]}")
-                self.sessions[server_name] = session
-                
-                async with session:
-                    session_tools = await session.list_tools()
-                    self.tool_by_session[server_name] = session_tools
-                    for tool in session_tools:
-                        function_name = f"{server_name}-{tool.name}"
-                        self.all_tools.append({
-                            "type": "function",
-                            "function": {
-                                "name": function_name,
-                                "description": tool.description,
-                                "parameters": tool.inputSchema,
-                                "required": list(tool.inputSchema.keys()) if tool.inputSchema else []
-                            }
-                        })
-            except Exception as e:
-                logger.error(f"❌ - 连接到 {server_name} 失败: {str(e)}")
+                registered = self.tools.register(server_name, tools)
+            except ValueError as e:
+                logger.error(f"❌ - {server_name} 工具注册失败: {e}")
+                self.startup_report[server_name]["status"] = "error"
                 continue
+            self.sessions[server_name] = session
+            self.semaphores[server_name] = asyncio.Semaphore(self.max_concurrency_per_server)
+            self.tool_by_session[server_name] = tools
+            self.all_tools.extend(entry.to_openai_tool() for entry in registered)
+        self.tool_retriever = ToolRetriever(self.tools)
+
+        logger.info("\n启动耗时报告：")
+        for server_name, report in self.startup_report.items():
+            logger.info(f" - {server_name}: {report['status']}, {report['elapsed']}s, {report['tools']} tools")
 
         logger.info("\n所有可用工具信息：")
         for tool in self.all_tools:
             logger.info(f" - {tool['function']['name']}: {tool['function']['description']}")
 
+    async def _start_server(self, server_name: str, server_file: str, startup_timeout: float):
+        """启动单个server并获取工具，返回 (session, tools, 耗时, 错误信息)"""
+        start = time.perf_counter()
+        with tracer.span("mcp.server.start", server=server_name) as span:
+            try:
+                session, tools = await asyncio.wait_for(self._connect_and_list(server_name, server_file), timeout=startup_timeout)
+                logger.info(f"⭕ - {server_name}: {server_file}")
+                span.set(tools=len(tools))
+                return session, tools, time.perf_counter() - start, None
+            except asyncio.TimeoutError:
+                logger.error(f"❌ - 连接到 {server_name} 超时: {startup_timeout}s")
+                span.set(error="timeout")
+                return None, [], time.perf_counter() - start, "timeout"
+            except Exception as e:
+                logger.error(f"❌ - 连接到 {server_name} 失败: {str(e)}")
+                span.set(error=type(e).__name__)
+                return None, [], time.perf_counter() - start, "error"
+
+    async def _connect_and_list(self, server_name: str, server_file: str):
+        client = await self.connect_to_server(server_file)
+        # 长连接在独立任务中保持打开，由 exit_stack 在 cleanup() 时统一关闭；
+        # 每次(重新)连接都基于同一 transport 创建新的 Client，避免复用已断开的会话状态
+        connection = BackgroundContext(lambda: Client(client.transport))
+        with tracer.span("mcp.server.spawn_initialize", server=server_name):
+            session = await connection.start()
+        self.connections[server_name] = connection
+        self.reconnect_locks[server_name] = asyncio.Lock()
+        self.exit_stack.push_async_callback(connection.stop)
+        with tracer.span("mcp.list_tools", server=server_name):
+            session_tools = await session.list_tools()
+        return session, session_tools
+
     async def connect_to_server(self, server_script_path: str):
-        """连接到 MCP 服务器"""
+        """创建 MCP 服务器客户端，连接由调用方打开"""
         is_python = server_script_path.endswith('.py')
         is_js = server_script_path.endswith('.js')
         if not (is_python or is_js):
@@ -64,24 +142,61 @@ class MCPClient:
             logger.error(f"⚠️ 连接服务器 {server_script_path} 失败: {e}")
             raise
 
+    async def _reconnect(self, server_name: str, connection: BackgroundContext, generation: int):
+        """重新建立与server的长连接，并发失败的调用只会触发一次重连"""
+        async with self.reconnect_locks[server_name]:
+            if self.generations.get(server_name, 0) != generation:
+                return
+            logger.warning(f"🔄 与 {server_name} 的连接已断开，正在重连")
+            await connection.stop()
+            self.sessions[server_name] = await connection.start()
+            self.generations[server_name] = generation + 1
+
+    async def _call_with_reconnect(self, server_name: str, tool_name: str, tool_args: dict):
+        connection = self.connections[server_name]
+        generation = self.generations.get(server_name, 0)
+        if connection.running:
+            try:
+                return await self.sessions[server_name].call_tool(tool_name, tool_args, _return_raw_result=True)
+            except CONNECTION_ERRORS:
+                pass
+        await self._reconnect(server_name, connection, generation)
+        return await self.sessions[server_name].call_tool(tool_name, tool_args, _return_raw_result=True)
+
     async def call_mcp_tool(self, tool_full_name: str, tool_args: dict) -> Optional[Any]:
         """根据工具名称和参数调用 MCP 工具，并处理错误"""
-        parts = tool_full_name.split("-")
-        if len(parts) != 2:
-            logger.warning(f"⚠️ 工具名称格式错误: {tool_full_name}，应为 'server_name-tool_name'")
-            return None
-        server_name, tool_name = parts
-        session = self.sessions.get(server_name)
-        if session is None:
-            logger.warning(f"⚠️ 未连接到服务器 {server_name} 来执行工具 {tool_full_name}")
+        entry = self.tools.get(tool_full_name)
+        if entry is None:
+            logger.warning(f"⚠️ 未找到工具 {tool_full_name}，应为已连接server提供的 'server_name-tool_name'")
             return None
-        if server_name not in self.tool_by_session or tool_name not in [_.name for _ in self.tool_by_session[server_name]]:
-            logger.warning(f"⚠️ 服务器 {server_name} 不支持工具 {tool_name}")
-            return None
-        logger.info(f"正在调用工具 {tool_full_name}，参数: {tool_args}")
+        server_name, tool_name = entry.server_name, entry.tool.name
+        # 参数在本地按 inputSchema 校验，错误直接返回给模型，无需请求server
+        error = entry.validate(tool_args)
+        if error:
+            logger.warning(f"⚠️ 工具 {tool_full_name} 参数校验失败: {error}")
+            return tool_error_result(f"参数校验失败: {error}")
+        # 命中缓存的调用没有 mcp.tool.execute 子 span
+        with tracer.span("mcp.tool_call", tool=tool_full_name):
+            if not self.result_cache.is_cacheable(tool_full_name):
+                return await self._invoke_tool(tool_full_name, server_name, tool_name, tool_args)
+            # 对配置了缓存的工具，相同参数的调用共享缓存结果及正在执行的请求
+            key = (server_name, tool_name, canonical_arguments(tool_args))
+            return await self.result_cache.get_or_call(
+                tool_full_name, key,
+                lambda: self._invoke_tool(tool_full_name, server_name, tool_name, tool_args),
+                should_store=lambda result: result is not None and not result.isError
+            )
+
+    async def _invoke_tool(self, tool_full_name: str, server_name: str, tool_name: str, tool_args: dict):
+        logger.info(f"正在调用工具 {tool_full_name}，参数: {truncate_for_log(tool_args)}")
         try:
-            async with session:
-                resp = await session.call_tool(tool_name, tool_args)
+            wait_start = time.time_ns()
+            async with self.semaphores[server_name]:
+                # 区分等待并发名额的时间与实际执行时间
+                tracer.record("mcp.tool.queue_wait", wait_start, time.time_ns(), server=server_name, tool=tool_name)
+                with tracer.span("mcp.tool.execute", server=server_name, tool=tool_name) as span:
+                    resp = await self._call_with_reconnect(server_name, tool_name, tool_args)
+                    span.set(is_error=resp.isError)
             return resp
         except Exception as e:
             logger.error(f"⚠️ 调用工具 {tool_full_name} 失败: {e}")
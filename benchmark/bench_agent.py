@@ -0,0 +1,259 @@
+"""
+Agent 端到端离线性能测试
+
+不依赖真实模型与 Bing：启动模拟 LLM 服务(mock_llm.py，按脚本返回 tool_calls，延迟可配置)
+与确定性的测试 MCP server(fake_mcp_server.py，stdio 与 SSE 两种方式)，
+以指定并发通过 run_agent 与 MCPClient 执行一批问题，输出:
+  - server 启动耗时(启动、initialize 与 list_tools)
+  - 每轮问答耗时的 p50/p95/p99，及扣除脚本中固定延迟后的客户端开销
+  - 工具调用开销(latency_ms=0 的工具调用往返耗时，stdio 与 SSE 均经 MCPClient，SSE 使用多会话连接池)
+  - 本进程与子进程(MCP server)的峰值 RSS
+
+用法:
+    python benchmark/bench_agent.py [--queries 64] [--concurrency 8] [--steps 1] [--tool-calls 2]
+                                    [--ttft-ms 50] [--chunk-ms 5] [--tool-latency-ms 20] [--json result.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT))
+# 测试时只输出警告以上的日志，避免日志输出影响计时
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from openai import AsyncOpenAI  # noqa: E402
+
+import run  # noqa: E402
+from MCP_StdioClient_1 import MCPClient as RemoteMCPClient  # noqa: E402
+from MCP_StdioClient_2 import MCPClient  # noqa: E402
+from trace_report import percentile  # noqa: E402
+
+FAKE_SERVER = str(BENCH_DIR / "fake_mcp_server.py")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"进程 {process.args} 已退出，返回码 {process.returncode}")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise TimeoutError(f"等待端口 {port} 超时")
+
+
+def stop_process(process: subprocess.Popen, timeout: float = 5):
+    """结束子进程；uvicorn 会等待未关闭的 SSE 连接，超时后强制结束"""
+    process.terminate()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def peak_rss_mb(who: int) -> float:
+    # Linux 上 ru_maxrss 的单位为 KB，macOS 上为字节
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def summarize(values: list) -> dict:
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "max": round(max(values), 2),
+    }
+
+
+def print_row(name: str, stats: dict):
+    print(f"  {name:<28}{stats['count']:>6}{stats['p50']:>10.2f}{stats['p95']:>10.2f}"
+          f"{stats['p99']:>10.2f}{stats['max']:>10.2f}")
+
+
+def scripted_floor_ms(args) -> float:
+    """脚本延迟决定的单轮问答最短耗时：每轮工具调用的流式输出与工具执行，再加最终回答"""
+    tool_step = args.ttft_ms + (args.tool_calls - 1) * args.chunk_ms + args.tool_latency_ms
+    answer = args.ttft_ms + (args.answer_chunks - 1) * args.chunk_ms
+    return args.steps * tool_step + answer
+
+
+async def run_queries(llm, mcp_client, queries: int, concurrency: int):
+    """以指定并发执行 run_agent，返回 (每轮耗时毫秒列表, 失败数, 总耗时秒)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one(i: int):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            answer = await run.run_agent(llm, mcp_client, f"benchmark query {i}", on_token=None)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if answer is None:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(queries)])
+    return latencies, failures, time.perf_counter() - start
+
+
+async def measure_tool_calls(call, calls: int, concurrency: int) -> list:
+    """以指定并发执行 calls 次零延迟工具调用，返回每次往返耗时(毫秒)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await call({"text": str(i), "latency_ms": 0})
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*[one(i) for i in range(calls)])
+    return latencies
+
+
+async def bench_stdio(args, llm) -> dict:
+    mcp_client = MCPClient(max_concurrency_per_server=args.server_concurrency)
+    start = time.perf_counter()
+    await mcp_client.connect_to_servers({"fake": FAKE_SERVER})
+    startup_ms = (time.perf_counter() - start) * 1000
+    if "fake" not in mcp_client.sessions:
+        await mcp_client.cleanup()
+        raise RuntimeError(f"测试 server 启动失败: {mcp_client.startup_report}")
+    try:
+        # 预热：首次调用包含连接与导入的一次性开销
+        await run.run_agent(llm, mcp_client, "warmup", on_token=None)
+        latencies, failures, elapsed = await run_queries(llm, mcp_client, args.queries, args.concurrency)
+        tool_latencies = await measure_tool_calls(
+            lambda tool_args: mcp_client.call_mcp_tool("fake-work", tool_args), args.tool_call_samples, args.concurrency
+        )
+    finally:
+        await mcp_client.cleanup()
+    return {
+        "startup_ms": round(startup_ms, 2),
+        "turn_ms": summarize(latencies),
+        "failures": failures,
+        "throughput_qps": round(args.queries / elapsed, 2),
+        "tool_call_ms": summarize(tool_latencies),
+    }
+
+
+async def bench_sse(args) -> dict:
+    port = free_port()
+    server = subprocess.Popen([sys.executable, FAKE_SERVER, "--sse", "--port", str(port)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        await wait_for_port(port, server)
+        mcp_client = RemoteMCPClient(max_concurrency_per_server=args.server_concurrency,
+                                     sessions_per_remote_server=args.remote_sessions)
+        start = time.perf_counter()
+        await mcp_client.connect_to_servers({"fake_sse": f"http://127.0.0.1:{port}/sse"})
+        startup_ms = (time.perf_counter() - start) * 1000
+        try:
+            if "fake_sse" not in mcp_client.sessions:
+                raise RuntimeError(f"测试 server 连接失败: {mcp_client.startup_report}")
+            tool_latencies = await measure_tool_calls(
+                lambda tool_args: mcp_client.call_mcp_tool("fake_sse-work", tool_args),
+                args.tool_call_samples, args.concurrency
+            )
+        finally:
+            await mcp_client.cleanup()
+    finally:
+        stop_process(server)
+    return {"startup_ms": round(startup_ms, 2), "sessions": args.remote_sessions,
+            "tool_call_ms": summarize(tool_latencies)}
+
+
+async def main_async(args) -> dict:
+    port = free_port()
+    mock = subprocess.Popen([
+        sys.executable, str(BENCH_DIR / "mock_llm.py"), "--port", str(port),
+        "--steps", str(args.steps), "--tool-calls", str(args.tool_calls),
+        "--tool-args", json.dumps({"latency_ms": args.tool_latency_ms, "size": args.tool_output_bytes}),
+        "--answer-chunks", str(args.answer_chunks), "--ttft-ms", str(args.ttft_ms), "--chunk-ms", str(args.chunk_ms),
+    ])
+    try:
+        await wait_for_port(port, mock)
+        run.llm_model_name = run.llm_model_name or "mock"
+        llm = AsyncOpenAI(api_key="mock", base_url=f"http://127.0.0.1:{port}/v1")
+        results = {"config": vars(args), "scripted_floor_ms": scripted_floor_ms(args)}
+        if args.transport in ("stdio", "both"):
+            results["stdio"] = await bench_stdio(args, llm)
+            # 子进程峰值 RSS 只统计已退出的子进程，因此在 stdio server 关闭后读取
+            results["peak_rss_children_mb"] = round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1)
+        if args.transport in ("sse", "both"):
+            results["sse"] = await bench_sse(args)
+        await llm.close()
+    finally:
+        stop_process(mock)
+    results["peak_rss_mb"] = round(peak_rss_mb(resource.RUSAGE_SELF), 1)
+    return results
+
+
+def report(results: dict):
+    args = results["config"]
+    print(f"问题数 {args['queries']}，并发 {args['concurrency']}，每问 {args['steps']} 轮 × {args['tool_calls']} 个工具调用，"
+          f"ttft {args['ttft_ms']}ms，chunk {args['chunk_ms']}ms，工具延迟 {args['tool_latency_ms']}ms")
+    print(f"{'':<30}{'count':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    if "stdio" in results:
+        stdio = results["stdio"]
+        print(f"stdio  启动耗时 {stdio['startup_ms']:.1f} ms，吞吐 {stdio['throughput_qps']} 问/秒，失败 {stdio['failures']}")
+        print_row("每轮问答", stdio["turn_ms"])
+        floor = results["scripted_floor_ms"]
+        overhead = {key: value - floor if key != "count" else value for key, value in stdio["turn_ms"].items()}
+        print_row(f"扣除脚本延迟({floor:.0f}ms)", overhead)
+        print_row("工具调用(MCPClient)", stdio["tool_call_ms"])
+    if "sse" in results:
+        sse = results["sse"]
+        print(f"sse    连接耗时 {sse['startup_ms']:.1f} ms，{sse['sessions']} 个会话")
+        print_row("工具调用(MCPClient)", sse["tool_call_ms"])
+    print(f"峰值 RSS: 本进程 {results['peak_rss_mb']} MB" +
+          (f"，MCP server 子进程 {results['peak_rss_children_mb']} MB" if "peak_rss_children_mb" in results else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=64, help="问题总数")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时执行的问题数")
+    parser.add_argument("--transport", choices=["stdio", "sse", "both"], default="both")
+    parser.add_argument("--steps", type=int, default=1, help="每个问题的工具调用轮数")
+    parser.add_argument("--tool-calls", type=int, default=2, help="每轮的工具调用数")
+    parser.add_argument("--answer-chunks", type=int, default=20, help="最终回答的片段数")
+    parser.add_argument("--ttft-ms", type=float, default=50, help="模拟 LLM 首个 chunk 的延迟")
+    parser.add_argument("--chunk-ms", type=float, default=5, help="模拟 LLM 其后每个 chunk 的延迟")
+    parser.add_argument("--tool-latency-ms", type=float, default=20, help="测试工具的执行耗时")
+    parser.add_argument("--tool-output-bytes", type=int, default=256, help="测试工具返回内容的大小")
+    parser.add_argument("--tool-call-samples", type=int, default=500, help="测量工具调用开销的调用次数")
+    parser.add_argument("--server-concurrency", type=int, default=16, help="MCPClient 单个 server 的并发上限")
+    parser.add_argument("--remote-sessions", type=int, default=4, help="SSE server 的会话池大小")
+    parser.add_argument("--json", help="将结果另存为 JSON，便于比较不同版本")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    report(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
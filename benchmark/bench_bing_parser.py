@@ -0,0 +1,86 @@
+"""
+搜索结果解析性能测试
+
+对保存的搜索结果页面分别使用各解析后端解析，输出每页解析耗时与吞吐量。
+legacy 为原先的整页 BeautifulSoup(html.parser) + 逐字段 select 实现，作为对照。
+
+用法:
+    python benchmark/bench_bing_parser.py [--pages benchmark/data/bing] [--rounds 50]
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "mcp_servers" / "python"))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+import bing_parser  # noqa: E402
+
+
+def extract_legacy(html: str, max_snippet_chars: int = 0) -> list:
+    """原实现：整页解析，缺少字段的条目跳过而非报错，便于对照"""
+    soup = BeautifulSoup(html, 'html.parser')
+    data = []
+    for parent in soup.select("#b_results > li"):
+        if parent.select_one('h2') is None:
+            continue
+        snippet = parent.select_one('div.b_caption > p')
+        link = parent.select_one('div.b_tpcn > a')
+        if snippet is None or link is None:
+            continue
+        data.append({
+            "title": parent.select_one('h2').text,
+            'snippet': snippet.text,
+            'link': link.get('href')
+        })
+    return data
+
+
+def run(pages: list, backend: str, extract, rounds: int) -> dict:
+    total_bytes = sum(len(html.encode("utf-8")) for html in pages)
+    durations = []
+    results = 0
+    for _ in range(rounds):
+        for html in pages:
+            start = time.perf_counter()
+            results += len(extract(html, bing_parser.MAX_SNIPPET_CHARS))
+            durations.append(time.perf_counter() - start)
+    elapsed = sum(durations)
+    return {
+        "backend": backend,
+        "mean_ms": statistics.mean(durations) * 1000,
+        "p95_ms": sorted(durations)[int(len(durations) * 0.95) - 1] * 1000,
+        "pages_per_s": len(durations) / elapsed,
+        "mb_per_s": total_bytes * rounds / elapsed / 1e6,
+        "results_per_page": results / len(durations),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default=str(ROOT / "benchmark" / "data" / "bing"), help="保存的搜索结果页面目录")
+    parser.add_argument("--rounds", type=int, default=50, help="每个页面重复解析次数")
+    args = parser.parse_args()
+
+    pages = [path.read_text(encoding="utf-8") for path in sorted(Path(args.pages).glob("*.html"))]
+    if not pages:
+        sys.exit(f"{args.pages} 中没有 .html 页面")
+
+    backends = {"legacy": extract_legacy}
+    for name, extract in bing_parser.BACKENDS.items():
+        backends[f"bs4[{bing_parser.BS4_FEATURES}]" if name == "bs4" else name] = extract
+
+    print(f"pages={len(pages)} rounds={args.rounds} default_backend={bing_parser.DEFAULT_BACKEND}")
+    print(f"{'backend':<20}{'mean ms':>10}{'p95 ms':>10}{'pages/s':>10}{'MB/s':>8}{'results':>9}")
+    for name, extract in backends.items():
+        report = run(pages, name, extract, args.rounds)
+        print(f"{report['backend']:<20}{report['mean_ms']:>10.3f}{report['p95_ms']:>10.3f}"
+              f"{report['pages_per_s']:>10.1f}{report['mb_per_s']:>8.2f}{report['results_per_page']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+命令校验性能测试
+
+生成一批命令(合法命令、带路径参数的命令、越界路径与 shell 操作符等非法命令)，
+分别用原先逐项检查的校验实现与编译后的 CommandPolicy 校验，输出每条命令的平均耗时与吞吐量，
+并确认两者对每条命令的判定一致。
+
+用法:
+    python benchmark/bench_command_policy.py [--commands 5000] [--rounds 5]
+"""
+import argparse
+import os
+import random
+import shlex
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "mcp_servers" / "python"))
+
+from command_policy import CommandPolicy, PolicyViolation  # noqa: E402
+
+ALLOWED_COMMANDS = {"ls", "cat", "pwd", "grep", "head", "wc"}
+ALLOWED_FLAGS = {"-l", "-a", "--help", "-n", "-i"}
+
+
+class LegacyValidator:
+    """原实现：逐个操作符扫描字符串，每个路径参数 realpath 两次，每次都重新解析允许目录"""
+
+    def __init__(self, allowed_dir: str):
+        self.allowed_dir = os.path.abspath(os.path.realpath(allowed_dir))
+
+    def _normalize_path(self, path: str) -> str:
+        if os.path.isabs(path):
+            real_path = os.path.abspath(os.path.realpath(path))
+        else:
+            real_path = os.path.abspath(os.path.realpath(os.path.join(self.allowed_dir, path)))
+        if not self._is_path_safe(real_path):
+            raise PolicyViolation(f"Path '{path}' is outside of allowed directory")
+        return real_path
+
+    def _is_path_safe(self, path: str) -> bool:
+        real_path = os.path.abspath(os.path.realpath(path))
+        allowed_dir_real = os.path.abspath(os.path.realpath(self.allowed_dir))
+        return real_path.startswith(allowed_dir_real)
+
+    def validate(self, command_string: str):
+        for operator in ["&&", "||", "|", ">", ">>", "<", "<<", ";"]:
+            if operator in command_string:
+                raise PolicyViolation(f"Shell operator '{operator}' is not supported")
+        try:
+            parts = shlex.split(command_string)
+        except ValueError as e:
+            raise PolicyViolation(str(e))
+        if not parts:
+            raise PolicyViolation("Empty command")
+        command, args = parts[0], parts[1:]
+        if command not in ALLOWED_COMMANDS:
+            raise PolicyViolation(f"Command '{command}' is not allowed")
+        validated_args = []
+        for arg in args:
+            if arg.startswith("-"):
+                if arg not in ALLOWED_FLAGS:
+                    raise PolicyViolation(f"Flag '{arg}' is not allowed")
+                validated_args.append(arg)
+            elif "/" in arg or "\\" in arg or os.path.isabs(arg) or arg == ".":
+                validated_args.append(self._normalize_path(arg))
+            else:
+                validated_args.append(arg)
+        return command, validated_args
+
+
+def make_commands(root: str, count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    files = ["a.txt", "b.log", "src/main.py", "src/util/io.py", "docs/README.md"]
+    templates = [
+        lambda: f"ls {rng.choice(['-l', '-a', ''])} {rng.choice(['.', 'src', 'docs/'])}",
+        lambda: f"cat {rng.choice(files)}",
+        lambda: f"cat {root}/{rng.choice(files)}",
+        lambda: f"grep -n {rng.choice(['TODO', 'import', 'def'])} ./{rng.choice(files)}",
+        lambda: f"head -n 5 '{rng.choice(files)}'",
+        lambda: "pwd",
+        lambda: f"cat ../{rng.choice(files)}",
+        lambda: f"cat /etc/{rng.choice(['passwd', 'hosts'])}",
+        lambda: f"ls {rng.choice(['-R', '--color'])}",
+        lambda: f"cat {rng.choice(files)} | wc -l",
+        lambda: f"rm {rng.choice(files)}",
+    ]
+    return [rng.choice(templates)() for _ in range(count)]
+
+
+def run(validate, commands: list, rounds: int) -> tuple:
+    outcomes = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        outcomes = []
+        for command in commands:
+            try:
+                outcomes.append(validate(command))
+            except PolicyViolation:
+                outcomes.append(None)
+    elapsed = time.perf_counter() - start
+    return elapsed, outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commands", type=int, default=5000, help="生成的命令数量")
+    parser.add_argument("--rounds", type=int, default=5, help="重复校验次数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        for name in ["a.txt", "b.log", "src/main.py", "src/util/io.py", "docs/README.md"]:
+            path = Path(root) / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("TODO\n")
+        commands = make_commands(root, args.commands)
+
+        validators = {
+            "legacy": LegacyValidator(root).validate,
+            "policy": CommandPolicy(root, ALLOWED_COMMANDS, ALLOWED_FLAGS).validate,
+        }
+        print(f"commands={len(commands)} rounds={args.rounds}")
+        print(f"{'validator':<12}{'us/cmd':>10}{'cmds/s':>12}{'allowed':>9}")
+        results = {}
+        for name, validate in validators.items():
+            elapsed, outcomes = run(validate, commands, args.rounds)
+            results[name] = outcomes
+            total = len(commands) * args.rounds
+            allowed = sum(outcome is not None for outcome in outcomes)
+            print(f"{name:<12}{elapsed / total * 1e6:>10.2f}{total / elapsed:>12.0f}{allowed:>9}")
+
+        # 只比较是否允许：CommandPolicy 会把允许目录中已存在的裸文件名也解析为绝对路径，参数与原实现不同
+        mismatches = [c for c, a, b in zip(commands, results["legacy"], results["policy"]) if (a is None) != (b is None)]
+        if mismatches:
+            print(f"{len(mismatches)} commands validated differently, e.g. {mismatches[0]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Bing 搜索桩服务器
+
+按查询关键词返回 benchmark/data/bing 中保存的搜索结果页面(同一关键词总是返回同一页面)，
+可配置响应延迟，并记录请求数与同时处理的最大请求数，供离线测试 bing_search 的并发与解析。
+关键词为 FAIL_QUERY 时返回 500，用于测试错误处理。
+
+用法:
+    python benchmark/bing_stub.py [--port 8765] [--latency-ms 50]
+    BING_URL=http://127.0.0.1:8765/ python mcp_servers/python/search_bing.py
+"""
+import argparse
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGES_DIR = ROOT / "benchmark" / "data" / "bing"
+FAIL_QUERY = "__stub_error__"
+
+
+def load_pages(pages_dir: Path = PAGES_DIR) -> list:
+    pages = [path.read_text(encoding="utf-8") for path in sorted(Path(pages_dir).glob("*.html"))]
+    if not pages:
+        raise FileNotFoundError(f"{pages_dir} 中没有 .html 页面")
+    return pages
+
+
+def page_index(query: str, count: int) -> int:
+    """关键词对应的页面序号，与进程无关，测试可据此计算期望结果"""
+    return zlib.crc32(query.encode("utf-8")) % count
+
+
+class BingStub:
+    """在后台线程中运行的桩服务器"""
+
+    def __init__(self, port: int = 0, latency_ms: float = 0, pages_dir: Path = PAGES_DIR):
+        self.pages = load_pages(pages_dir)
+        self.latency_ms = latency_ms
+        self.requests = 0
+        self.inflight = 0
+        self.peak_inflight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/"
+
+    def page_for(self, query: str) -> str:
+        return self.pages[page_index(query, len(self.pages))]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+                with stub._lock:
+                    stub.requests += 1
+                    stub.inflight += 1
+                    stub.peak_inflight = max(stub.peak_inflight, stub.inflight)
+                try:
+                    if stub.latency_ms:
+                        time.sleep(stub.latency_ms / 1000)
+                    if query == FAIL_QUERY:
+                        self.send_error(500)
+                        return
+                    body = stub.page_for(query).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with stub._lock:
+                        stub.inflight -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "BingStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "BingStub":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个请求的响应延迟")
+    args = parser.parse_args()
+
+    stub = BingStub(args.port, args.latency_ms)
+    print(f"Bing 桩服务器监听 {stub.url}，{len(stub.pages)} 个页面")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
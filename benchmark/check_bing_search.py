@@ -0,0 +1,82 @@
+"""
+bing_search 离线并发检查
+
+启动 Bing 桩服务器(bing_stub.py)并通过 BING_URL 指向它，并发执行一批查询，检查:
+  - 每个关键词的结果与直接解析对应页面的结果一致
+  - search_many 按链接合并去重，记录每条结果来自哪些关键词，失败的关键词记入 errors
+  - 同时进行的请求数不超过 BING_MAX_CONCURRENCY，且请求确实并发执行
+任一检查不通过时以非零状态退出。
+
+用法:
+    python benchmark/check_bing_search.py [--queries 32] [--concurrency 4] [--latency-ms 50]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "mcp_servers" / "python"))
+
+from bing_stub import FAIL_QUERY, BingStub  # noqa: E402
+
+
+async def check(stub: BingStub, args):
+    # bing_search 在导入时读取环境变量
+    import bing_parser
+    import bing_search
+
+    queries = [f"query {i}" for i in range(args.queries)]
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[bing_search.search(query) for query in queries])
+    elapsed = time.perf_counter() - start
+    for query, items in zip(queries, results):
+        expected = bing_parser.extract_results(stub.page_for(query))
+        assert items, f"{query!r} 没有解析出结果"
+        assert items == expected, f"{query!r} 的结果与页面解析结果不一致"
+    assert stub.requests == len(queries), f"请求数 {stub.requests}，应为 {len(queries)}"
+    assert stub.peak_inflight <= args.concurrency, f"同时请求数 {stub.peak_inflight} 超过上限 {args.concurrency}"
+    sequential = len(queries) * args.latency_ms / 1000
+    if args.concurrency > 1 and len(queries) > 1:
+        assert stub.peak_inflight > 1, "请求没有并发执行"
+        assert elapsed < sequential, f"耗时 {elapsed:.2f}s 不少于串行耗时 {sequential:.2f}s"
+    print(f"search: {len(queries)} 个查询，耗时 {elapsed:.2f}s(串行约 {sequential:.2f}s)，"
+          f"最大同时请求 {stub.peak_inflight}/{args.concurrency}")
+
+    merged = await bing_search.search_many(queries + queries[:2] + [FAIL_QUERY])
+    expected_queries = {}
+    for query in queries:
+        for item in bing_parser.extract_results(stub.page_for(query)):
+            expected_queries.setdefault(item["link"] or item["title"], []).append(query)
+    assert set(merged["errors"]) == {FAIL_QUERY}, f"errors 应只包含失败的关键词: {merged['errors']}"
+    links = [item["link"] or item["title"] for item in merged["results"]]
+    assert len(links) == len(set(links)), "合并结果中有重复的链接"
+    assert {link: item["queries"] for link, item in zip(links, merged["results"])} == expected_queries, \
+        "合并结果的链接或来源关键词不正确"
+    print(f"search_many: 合并为 {len(links)} 条结果，失败关键词 {list(merged['errors'])}")
+
+    await bing_search.get_client().aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=32, help="并发查询的关键词数")
+    parser.add_argument("--concurrency", type=int, default=4, help="BING_MAX_CONCURRENCY")
+    parser.add_argument("--latency-ms", type=float, default=50, help="桩服务器每个请求的响应延迟")
+    args = parser.parse_args()
+
+    with BingStub(latency_ms=args.latency_ms) as stub:
+        os.environ["BING_URL"] = stub.url
+        os.environ["BING_MAX_CONCURRENCY"] = str(args.concurrency)
+        try:
+            asyncio.run(check(stub, args))
+        except AssertionError as e:
+            sys.exit(f"检查失败: {e}")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
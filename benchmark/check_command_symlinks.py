@@ -0,0 +1,81 @@
+"""
+命令行 server 符号链接越界检查
+
+在临时允许目录中构造指向目录外文件的符号链接，通过 CommandExecutor 执行 cat / ls，检查:
+  - 以裸文件名(link)、./link 或 sub/f.txt 形式引用越界符号链接的命令都被拒绝
+  - 路径解析缓存有效期内把目录替换为越界符号链接后，cat 不会读到目录外的文件
+  - 指向允许目录内的符号链接仍可正常读取
+任一检查不通过时以非零状态退出。
+
+用法:
+    python benchmark/check_command_symlinks.py
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "mcp_servers" / "python"))
+
+SECRET = "secret outside of allowed dir\n"
+
+
+async def expect_rejected(executor, command: str):
+    from CommandLine import CommandSecurityError
+
+    try:
+        result = await executor.execute(command)
+    except CommandSecurityError:
+        return
+    assert SECRET.strip() not in result.stdout, f"{command!r} 读到了目录外的文件"
+    raise AssertionError(f"{command!r} 未被拒绝: {result.stdout!r}")
+
+
+async def check(base: str):
+    root, outside = os.path.join(base, "root"), os.path.join(base, "outside")
+    os.makedirs(os.path.join(root, "sub"))
+    os.makedirs(outside)
+    Path(outside, "f.txt").write_text(SECRET)
+    Path(outside, "secret.txt").write_text(SECRET)
+    Path(root, "sub", "f.txt").write_text("inside\n")
+    Path(root, "inside.txt").write_text("inside\n")
+
+    # CommandLine 在导入时按环境变量创建 executor
+    os.environ["ALLOWED_DIR"] = root
+    from CommandLine import CommandExecutor, SecurityConfig
+
+    config = SecurityConfig(allowed_commands={"cat", "ls"}, allowed_flags=set(), max_command_length=1024,
+                            command_timeout=5, read_only_commands={"cat", "ls"})
+    executor = CommandExecutor(root, config)
+
+    os.symlink(os.path.join(outside, "secret.txt"), os.path.join(root, "link"))
+    for command in ("cat link", "cat ./link", "ls link", "cat inside.txt link"):
+        await expect_rejected(executor, command)
+    print("越界符号链接: 裸文件名与相对路径均被拒绝")
+
+    # 先读一次使解析结果进入缓存，再把目录替换为越界符号链接
+    assert (await executor.execute("cat sub/f.txt")).stdout == "inside\n"
+    shutil.rmtree(os.path.join(root, "sub"))
+    os.symlink(outside, os.path.join(root, "sub"))
+    await expect_rejected(executor, "cat sub/f.txt")
+    print("缓存有效期内替换目录: 被拒绝")
+
+    os.symlink(os.path.join(root, "inside.txt"), os.path.join(root, "inside_link"))
+    assert (await executor.execute("cat inside_link")).stdout == "inside\n", "允许目录内的符号链接应可读取"
+    print("允许目录内的符号链接: 可读取")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as base:
+        try:
+            asyncio.run(check(base))
+        except AssertionError as e:
+            sys.exit(f"检查失败: {e}")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+用于性能测试的确定性 MCP server
+
+提供 work 工具：按参数等待指定毫秒数后返回固定内容，输出只由参数决定。
+默认通过 stdio 运行(可直接写入 MCPClient 的 servers 配置)，--sse 时以 SSE 方式监听端口。
+
+用法:
+    python benchmark/fake_mcp_server.py [--sse] [--port 18088]
+"""
+import argparse
+import asyncio
+
+from mcp.server.fastmcp import FastMCP
+
+mcp_server = FastMCP("FakeServer", log_level="WARNING")
+
+
+@mcp_server.tool(name="work", description="测试工具：等待 latency_ms 毫秒后返回 text 与 size 字节的填充内容")
+async def work(text: str = "", latency_ms: float = 0, size: int = 0) -> str:
+    if latency_ms > 0:
+        await asyncio.sleep(latency_ms / 1000)
+    return f"{text}:" + "x" * size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sse", action="store_true", help="以 SSE 方式运行")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18088)
+    args = parser.parse_args()
+
+    if args.sse:
+        mcp_server.settings.host = args.host
+        mcp_server.settings.port = args.port
+        mcp_server.run(transport="sse")
+    else:
+        mcp_server.run()
@@ -0,0 +1,127 @@
+"""
+模拟 LLM 服务
+
+兼容 OpenAI /v1/chat/completions(流式与非流式)的本地服务，按脚本返回固定的 tool_calls 与回答，
+首个 chunk 前与其后每个 chunk 前的延迟均可配置，便于在没有真实模型的情况下测量 Agent 的吞吐与开销。
+
+脚本：每轮用户提问后，若请求携带了工具且本轮已有的 assistant 消息少于 --steps 条，
+则返回 --tool-calls 个工具调用(依次使用请求中名称以 -<tool> 结尾的工具，参数为 --tool-args)；
+否则返回由 --answer-chunks 个片段组成的最终回答。
+
+用法:
+    python benchmark/mock_llm.py [--port 18080] [--steps 1] [--tool-calls 2] [--ttft-ms 50] [--chunk-ms 5]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+
+class ScriptedLLM:
+    """按脚本生成回复"""
+
+    def __init__(self, steps: int = 1, tool_calls: int = 2, tool: str = "work", tool_args: dict = None,
+                 answer_chunks: int = 20, ttft_ms: float = 50, chunk_ms: float = 5):
+        self.steps = steps
+        self.tool_calls = tool_calls
+        self.tool_suffix = f"-{tool}"
+        self.tool_args = tool_args or {}
+        self.answer_chunks = answer_chunks
+        self.ttft = ttft_ms / 1000
+        self.chunk_delay = chunk_ms / 1000
+        self.requests = 0
+
+    def plan(self, body: dict):
+        """返回本次请求的回复：("tool_calls", [...]) 或 ("content", [片段...])"""
+        messages = body.get("messages", [])
+        last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+        step = sum(1 for m in messages[last_user + 1:] if m.get("role") == "assistant")
+        names = [tool["function"]["name"] for tool in body.get("tools") or []
+                 if tool["function"]["name"].endswith(self.tool_suffix)]
+        if names and step < self.steps:
+            return "tool_calls", [{
+                "id": f"call_{self.requests}_{i}",
+                "type": "function",
+                "function": {"name": names[i % len(names)], "arguments": json.dumps({**self.tool_args, "text": f"{step}-{i}"})},
+            } for i in range(self.tool_calls)]
+        return "content", [f"token{i} " for i in range(self.answer_chunks)]
+
+    @staticmethod
+    def _chunk(delta: dict, finish_reason: str = None) -> str:
+        payload = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": "mock",
+                   "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+        return f"data: {json.dumps(payload)}\n\n"
+
+    @staticmethod
+    def _usage(body: dict, completion_tokens: int) -> dict:
+        prompt_tokens = len(json.dumps(body.get("messages", []), ensure_ascii=False)) // 4
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    async def stream(self, body: dict):
+        kind, items = self.plan(body)
+        for i, item in enumerate(items):
+            await asyncio.sleep(self.ttft if i == 0 else self.chunk_delay)
+            if kind == "tool_calls":
+                yield self._chunk({"role": "assistant", "tool_calls": [{"index": i, **item}]})
+            else:
+                yield self._chunk({"role": "assistant", "content": item})
+        yield self._chunk({}, "tool_calls" if kind == "tool_calls" else "stop")
+        # 与 OpenAI 相同，只在请求 stream_options.include_usage 时返回 token 用量
+        if not (body.get("stream_options") or {}).get("include_usage"):
+            yield "data: [DONE]\n\n"
+            return
+        usage = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": "mock",
+                 "choices": [], "usage": self._usage(body, len(items))}
+        yield f"data: {json.dumps(usage)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    async def complete(self, body: dict) -> dict:
+        kind, items = self.plan(body)
+        await asyncio.sleep(self.ttft + self.chunk_delay * max(0, len(items) - 1))
+        message = {"role": "assistant", "content": None if kind == "tool_calls" else "".join(items)}
+        if kind == "tool_calls":
+            message["tool_calls"] = items
+        return {"id": "mock", "object": "chat.completion", "created": int(time.time()), "model": "mock",
+                "choices": [{"index": 0, "message": message,
+                             "finish_reason": "tool_calls" if kind == "tool_calls" else "stop"}],
+                "usage": self._usage(body, len(items))}
+
+
+def create_app(llm: ScriptedLLM) -> Starlette:
+    async def chat_completions(request: Request):
+        body = await request.json()
+        llm.requests += 1
+        if body.get("stream"):
+            return StreamingResponse(llm.stream(body), media_type="text/event-stream")
+        return JSONResponse(await llm.complete(body))
+
+    return Starlette(routes=[Route("/v1/chat/completions", chat_completions, methods=["POST"])])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--steps", type=int, default=1, help="每个问题返回工具调用的轮数")
+    parser.add_argument("--tool-calls", type=int, default=2, help="每轮返回的工具调用数")
+    parser.add_argument("--tool", default="work", help="调用的工具名(不含 server 前缀)")
+    parser.add_argument("--tool-args", default="{}", help="工具调用参数(JSON)")
+    parser.add_argument("--answer-chunks", type=int, default=20, help="最终回答的片段数")
+    parser.add_argument("--ttft-ms", type=float, default=50, help="首个 chunk 前的延迟(毫秒)")
+    parser.add_argument("--chunk-ms", type=float, default=5, help="其后每个 chunk 前的延迟(毫秒)")
+    args = parser.parse_args()
+
+    llm = ScriptedLLM(args.steps, args.tool_calls, args.tool, json.loads(args.tool_args),
+                      args.answer_chunks, args.ttft_ms, args.chunk_ms)
+    uvicorn.run(create_app(llm), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
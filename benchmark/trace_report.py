@@ -0,0 +1,164 @@
+"""
+链路追踪报告
+
+report: 读取 common.tracing 导出的 JSON Lines 文件，按阶段(span 名称)输出次数与耗时 p50/p95/p99，
+        LLM 调用额外输出首 token 延迟(ttft)与 token 数量。
+collect: 启动一个本地 OTLP/HTTP(JSON 编码)收集器替身，把收到的 span 以相同格式追加写入 JSON Lines 文件，
+         供 TRACE_EXPORT=otlp 时使用。
+
+用法:
+    python benchmark/trace_report.py report [logs/traces.jsonl] [--by-attr server]
+    python benchmark/trace_report.py collect [--port 4318] [--output logs/traces.jsonl]
+"""
+import argparse
+import json
+import math
+import sys
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def percentile(values: list, p: float) -> float:
+    """最近秩百分位数：排序后第 ceil(p/100 * n) 个值
+
+    >>> percentile([7], 50), percentile([7], 99)
+    (7, 7)
+    >>> percentile([1, 2], 50), percentile([1, 2], 95)
+    (1, 2)
+    >>> [percentile(list(range(1, 11)), p) for p in (10, 50, 90, 95, 99, 100)]
+    [1, 5, 9, 10, 10, 10]
+    """
+    ordered = sorted(values)
+    index = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def load_spans(path: str) -> list:
+    spans = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                spans.append(json.loads(line))
+    return spans
+
+
+def report(spans: list, by_attr: str = None):
+    stages = defaultdict(list)
+    for span in spans:
+        name = span["name"]
+        if by_attr and span["attributes"].get(by_attr) is not None:
+            name = f"{name}[{span['attributes'][by_attr]}]"
+        stages[name].append(span["duration_ms"])
+        if span["name"] == "llm.completion" and span["attributes"].get("ttft_ms") is not None:
+            stages["llm.completion.ttft"].append(span["attributes"]["ttft_ms"])
+
+    print(f"{'stage':<40}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'max ms':>11}")
+    for name in sorted(stages):
+        values = stages[name]
+        print(f"{name:<40}{len(values):>7}{percentile(values, 50):>11.2f}{percentile(values, 95):>11.2f}"
+              f"{percentile(values, 99):>11.2f}{max(values):>11.2f}")
+
+    completions = [span["attributes"] for span in spans if span["name"] == "llm.completion"]
+    if completions:
+        prompt = sum(attrs.get("prompt_tokens") or 0 for attrs in completions)
+        completion = sum(attrs.get("completion_tokens") or 0 for attrs in completions)
+        estimated = sum(1 for attrs in completions if attrs.get("usage_source") == "estimate")
+        print(f"\nLLM 调用 {len(completions)} 次，prompt tokens {prompt}，completion tokens {completion}"
+              + (f"(其中 {estimated} 次为估算)" if estimated else ""))
+
+
+def _from_otlp_value(value: dict):
+    if "intValue" in value:
+        return int(value["intValue"])
+    for key in ("doubleValue", "boolValue", "stringValue"):
+        if key in value:
+            return value[key]
+    return None
+
+
+def from_otlp(payload: dict) -> list:
+    """将 OTLP/HTTP JSON 请求转换为 common.tracing 的 JSON Lines 格式"""
+    spans = []
+    for resource_spans in payload.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for span in scope_spans.get("spans", []):
+                start, end = int(span["startTimeUnixNano"]), int(span["endTimeUnixNano"])
+                spans.append({
+                    "name": span["name"],
+                    "trace_id": span["traceId"],
+                    "span_id": span["spanId"],
+                    "parent_id": span.get("parentSpanId") or None,
+                    "start_ns": start,
+                    "end_ns": end,
+                    "duration_ms": round((end - start) / 1e6, 3),
+                    "status": "error" if span.get("status", {}).get("code") == 2 else "ok",
+                    "attributes": {attr["key"]: _from_otlp_value(attr["value"]) for attr in span.get("attributes", [])},
+                })
+    return spans
+
+
+def collect(port: int, output: str):
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/v1/traces":
+                self.send_error(404)
+                return
+            try:
+                spans = from_otlp(json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0)))))
+            except (ValueError, KeyError) as e:
+                self.send_error(400, str(e))
+                return
+            with lock, open(output, "a", encoding="utf-8") as file:
+                for span in spans:
+                    file.write(json.dumps(span, ensure_ascii=False) + "\n")
+            body = b"{}"
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"OTLP/HTTP 收集器监听 http://127.0.0.1:{port}/v1/traces，写入 {output}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="输出各阶段耗时百分位数")
+    report_parser.add_argument("path", nargs="?", default=str(ROOT / "logs" / "traces.jsonl"), help="span 文件")
+    report_parser.add_argument("--by-attr", help="按属性(如 server、tool)进一步拆分阶段")
+    collect_parser = subparsers.add_parser("collect", help="启动 OTLP/HTTP 收集器替身")
+    collect_parser.add_argument("--port", type=int, default=4318)
+    collect_parser.add_argument("--output", default=str(ROOT / "logs" / "traces.jsonl"))
+    args = parser.parse_args()
+
+    if args.command == "collect":
+        collect(args.port, args.output)
+        return
+    if not Path(args.path).exists():
+        sys.exit(f"{args.path} 不存在，请先设置 TRACE_EXPORT=jsonl 运行")
+    spans = load_spans(args.path)
+    if not spans:
+        sys.exit(f"{args.path} 中没有 span")
+    report(spans, args.by_attr)
+
+
+if __name__ == "__main__":
+    main()
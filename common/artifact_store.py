@@ -0,0 +1,182 @@
+# This module keeps large tool results out of the chat history.
+# Results above a size threshold are written once to a content-addressed store (files named
+# by their SHA-256 under a cache directory, so identical outputs are stored only once), and
+# the conversation carries a short handle plus a preview instead of the full text.
+# Built-in tools let the model read byte ranges of an artifact or grep it when it needs more.
+
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Handles look like "artifact:<first 16 hex chars of the SHA-256>"
+HANDLE_PREFIX = "artifact:"
+HANDLE_PATTERN = re.compile(r"artifact:([0-9a-f]{16,64})")
+# Upper bound of bytes returned by a single read, so reads cannot flood the context again
+MAX_READ_BYTES = 16 * 1024
+
+READ_TOOL_NAME = "artifact-read"
+GREP_TOOL_NAME = "artifact-grep"
+
+ARTIFACT_TOOLS: List[Dict[str, Any]] = [
+    {
+        "type": "function",
+        "function": {
+            "name": READ_TOOL_NAME,
+            "description": "读取已保存的较大工具结果(artifact)中指定字节范围的内容",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "handle": {"type": "string", "description": "工具结果中给出的 artifact 标识，如 artifact:0123abcd..."},
+                    "offset": {"type": "integer", "description": "起始字节偏移，默认 0"},
+                    "length": {"type": "integer", "description": f"读取的字节数，最多 {MAX_READ_BYTES}"},
+                },
+                "required": ["handle"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": GREP_TOOL_NAME,
+            "description": "在已保存的较大工具结果(artifact)中按正则表达式搜索，返回匹配行及其行号与字节偏移",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "handle": {"type": "string", "description": "工具结果中给出的 artifact 标识"},
+                    "pattern": {"type": "string", "description": "正则表达式"},
+                    "max_matches": {"type": "integer", "description": "最多返回的匹配行数，默认 50"},
+                },
+                "required": ["handle", "pattern"],
+            },
+        },
+    },
+]
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for large tool results.
+    """
+
+    def __init__(self, root: str, inline_limit_bytes: int = 8192, preview_bytes: int = 1024):
+        """
+        Args:
+            root: Directory holding the artifacts (created on first write).
+            inline_limit_bytes: Results up to this size stay inline in the conversation.
+            preview_bytes: Size of the preview kept in the conversation for spilled results.
+        """
+        self.root = Path(root)
+        self.inline_limit_bytes = inline_limit_bytes
+        self.preview_bytes = preview_bytes
+        self.stats: Dict[str, int] = {"spilled": 0, "deduplicated": 0, "bytes_spilled": 0}
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def put(self, data: bytes) -> str:
+        """
+        Stores data (once per distinct content) and returns its handle.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if path.exists():
+            self.stats["deduplicated"] += 1
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first so a reader never sees a partial artifact
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as file:
+                    file.write(data)
+                os.replace(tmp, path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+        return HANDLE_PREFIX + digest[:16]
+
+    def resolve(self, handle: str) -> Optional[Path]:
+        """
+        Returns the file of a handle, or None if it is unknown.
+        """
+        match = HANDLE_PATTERN.fullmatch(handle.strip())
+        if match is None:
+            return None
+        prefix = match.group(1)
+        directory = self.root / prefix[:2]
+        if not directory.is_dir():
+            return None
+        for path in directory.iterdir():
+            if path.name.startswith(prefix):
+                return path
+        return None
+
+    def spill(self, text: str) -> str:
+        """
+        Returns text unchanged if it is small, otherwise stores it and returns a handle plus preview.
+        """
+        data = text.encode("utf-8")
+        if len(data) <= self.inline_limit_bytes:
+            return text
+        handle = self.put(data)
+        self.stats["spilled"] += 1
+        self.stats["bytes_spilled"] += len(data)
+        preview = data[:self.preview_bytes].decode("utf-8", errors="ignore")
+        return (
+            f"[结果较大({len(data)} 字节，{text.count(chr(10)) + 1} 行)，已完整保存为 {handle}，"
+            f"以下为开头 {self.preview_bytes} 字节预览；需要更多内容时使用 {READ_TOOL_NAME} 读取指定字节范围"
+            f"或 {GREP_TOOL_NAME} 搜索]\n{preview}\n..."
+        )
+
+    def read(self, handle: str, offset: int = 0, length: int = MAX_READ_BYTES) -> str:
+        path = self.resolve(handle)
+        if path is None:
+            return f"未找到 {handle}"
+        size = path.stat().st_size
+        offset = max(0, min(int(offset), size))
+        length = max(0, min(int(length), MAX_READ_BYTES))
+        with open(path, "rb") as file:
+            file.seek(offset)
+            data = file.read(length)
+        end = offset + len(data)
+        return f"[{handle} 字节 {offset}-{end} / {size}]\n" + data.decode("utf-8", errors="replace")
+
+    def grep(self, handle: str, pattern: str, max_matches: int = 50) -> str:
+        path = self.resolve(handle)
+        if path is None:
+            return f"未找到 {handle}"
+        try:
+            regex = re.compile(pattern)
+        except re.error as e:
+            return f"正则表达式无效: {e}"
+        matches = []
+        offset = 0
+        with open(path, "rb") as file:
+            for number, raw in enumerate(file, 1):
+                line = raw.decode("utf-8", errors="replace").rstrip("\n")
+                if regex.search(line):
+                    if len(matches) >= max_matches:
+                        matches.append(f"... 超过 {max_matches} 处匹配，已截止")
+                        break
+                    matches.append(f"{number}:{offset}: {line[:500]}")
+                offset += len(raw)
+        if not matches:
+            return f"{handle} 中没有匹配 {pattern!r} 的行"
+        return "\n".join(matches)
+
+    def call_tool(self, name: str, arguments: Dict[str, Any]) -> str:
+        """
+        Runs one of the built-in artifact tools.
+        """
+        if name == READ_TOOL_NAME:
+            return self.read(arguments["handle"], arguments.get("offset", 0), arguments.get("length", MAX_READ_BYTES))
+        if name == GREP_TOOL_NAME:
+            return self.grep(arguments["handle"], arguments["pattern"], arguments.get("max_matches", 50))
+        raise ValueError(f"Unknown artifact tool: {name}")
+
+    @staticmethod
+    def is_artifact_tool(name: str) -> bool:
+        return name in (READ_TOOL_NAME, GREP_TOOL_NAME)
@@ -0,0 +1,85 @@
+# This module runs an async context manager inside its own background task.
+# MCP transports (stdio_client, fastmcp Client) open anyio task groups, whose cancel
+# scopes must be entered and exited by the same task. Owning each connection in a
+# dedicated task lets several servers start concurrently and be closed from anywhere.
+
+import asyncio
+from typing import Any, AsyncContextManager, Awaitable, Callable, Optional
+
+
+class BackgroundContext:
+    """
+    Enters an async context manager in a background task and keeps it open until stop().
+    """
+
+    def __init__(self, cm_factory: Callable[[], AsyncContextManager[Any]],
+                 on_enter: Optional[Callable[[Any], Awaitable[Any]]] = None):
+        """
+        Args:
+            cm_factory: Builds the context manager to enter (called once per start()).
+            on_enter: Optional coroutine run inside the context right after entering it,
+                e.g. session.initialize(). Its return value replaces the entered value.
+        """
+        self._cm_factory = cm_factory
+        self._on_enter = on_enter
+        self._task: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> Any:
+        """
+        Starts the background task and waits until the context is entered.
+        Cancelling the caller (e.g. via asyncio.wait_for) also tears down the task.
+        """
+        loop = asyncio.get_running_loop()
+        ready: asyncio.Future = loop.create_future()
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._run(ready, self._stop))
+        try:
+            return await asyncio.shield(ready)
+        except BaseException:
+            # The context was never entered, so there is nothing to exit gracefully
+            self._task.cancel()
+            await self.stop()
+            raise
+
+    async def _run(self, ready: asyncio.Future, stop: asyncio.Event):
+        try:
+            async with self._cm_factory() as value:
+                if self._on_enter is not None:
+                    value = await self._on_enter(value)
+                if not ready.done():
+                    ready.set_result(value)
+                await stop.wait()
+        except BaseException as e:
+            if not ready.done():
+                if isinstance(e, asyncio.CancelledError):
+                    ready.cancel()
+                else:
+                    ready.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+
+    async def stop(self):
+        """
+        Signals the background task to exit the context and waits for it to finish.
+        """
+        task, self._task = self._task, None
+        if task is None:
+            return
+        self._stop.set()
+        if not task.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout=5)
+            except asyncio.TimeoutError:
+                task.cancel()
+            except Exception:
+                pass
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+        elif not task.cancelled():
+            task.exception()
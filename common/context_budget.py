@@ -0,0 +1,214 @@
+# This module keeps the message history sent to the LLM within a per-request token budget.
+# System messages, the latest user message and the most recent steps are kept verbatim, and
+# an assistant message is never separated from the tool results answering its tool_calls.
+# When the history is over budget, older tool outputs are shrunk to short previews first,
+# then old steps are folded into a rolling summary (if a summarizer is given) or dropped.
+
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from common.tokens import count_json_tokens, count_tokens
+
+# Approximate per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+Summarizer = Callable[[Optional[str], List[Dict[str, Any]]], Awaitable[str]]
+
+
+@dataclass
+class BudgetReport:
+    """
+    What fit() did for one request.
+    """
+
+    budget: int
+    tokens_before: int
+    tokens_after: int = 0
+    shrunk: int = 0
+    summarized: int = 0
+    dropped: int = 0
+
+    @property
+    def over_budget(self) -> bool:
+        return self.tokens_after > self.budget
+
+
+@dataclass
+class _Group:
+    """
+    Messages that must stay together: a user message, a plain assistant reply, or an
+    assistant message with tool_calls followed by its tool results.
+    """
+
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class ContextBudget:
+    """
+    Fits a conversation's message list into a token budget before each LLM request.
+
+    One instance should be used per conversation: token counts of unchanged messages
+    are memoized, and the rolling summary is extended rather than rebuilt.
+    """
+
+    def __init__(self, max_tokens: int, keep_recent: int = 4, preview_tokens: int = 200,
+                 summarizer: Optional[Summarizer] = None):
+        """
+        Args:
+            max_tokens: Token budget for the messages of one request (tools not included).
+            keep_recent: Number of most recent groups (user turns / assistant steps) kept intact.
+            preview_tokens: Size of the preview an older tool output is shrunk to.
+            summarizer: Optional coroutine (previous_summary, messages) -> summary used to fold
+                old groups into a rolling summary instead of dropping them.
+        """
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.preview_tokens = preview_tokens
+        self.summarizer = summarizer
+        self.summary: Optional[str] = None
+        self._summary_message: Optional[Dict[str, Any]] = None
+        # Messages already folded into the summary, by id (the value keeps the id from being reused)
+        self._summarized: Dict[int, Dict[str, Any]] = {}
+        self._counts: Dict[int, tuple] = {}
+        self._previews: Dict[int, tuple] = {}
+        self.last_report: Optional[BudgetReport] = None
+        self.stats: Dict[str, int] = {"requests": 0, "tokens_before": 0, "tokens_sent": 0}
+
+    def count_message(self, message: Dict[str, Any]) -> int:
+        """
+        Returns the token count of a message, memoized per message object.
+        """
+        cached = self._counts.get(id(message))
+        if cached is not None and cached[0] is message:
+            return cached[1]
+        tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get("content") or "")
+        if message.get("tool_calls"):
+            tokens += count_json_tokens(message["tool_calls"])
+        # Keep a reference so the id cannot be reused by another message
+        self._counts[id(message)] = (message, tokens)
+        return tokens
+
+    def count(self, messages: List[Dict[str, Any]]) -> int:
+        return sum(self.count_message(message) for message in messages)
+
+    def preview(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Returns a copy of a tool message whose content is cut to about preview_tokens.
+        The copy is memoized so repeated requests reuse it (and its token count).
+        """
+        cached = self._previews.get(id(message))
+        if cached is not None and cached[0] is message:
+            return cached[1]
+        text = message.get("content") or ""
+        tokens = count_tokens(text)
+        shrunk = message
+        if tokens > self.preview_tokens:
+            head = text[:max(1, len(text) * self.preview_tokens // tokens)]
+            shrunk = {**message, "content": f"{head}\n... [工具结果已截断，原长约 {tokens} tokens]"}
+        self._previews[id(message)] = (message, shrunk)
+        return shrunk
+
+    def _is_summarized(self, message: Dict[str, Any]) -> bool:
+        return self._summarized.get(id(message)) is message
+
+    @staticmethod
+    def _group(messages: List[Dict[str, Any]]) -> List[_Group]:
+        groups: List[_Group] = []
+        for message in messages:
+            if message.get("role") == "tool" and groups and groups[-1].messages[0].get("tool_calls"):
+                groups[-1].messages.append(message)
+            else:
+                groups.append(_Group([message]))
+        return groups
+
+    def _forget(self, messages: List[Dict[str, Any]]):
+        for message in messages:
+            self._counts.pop(id(message), None)
+            cached = self._previews.pop(id(message), None)
+            if cached is not None:
+                self._counts.pop(id(cached[1]), None)
+
+    async def fit(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Returns the messages to send for this request; the input list is not modified.
+        """
+        report = BudgetReport(budget=self.max_tokens, tokens_before=self.count(messages))
+        result = await self._fit(messages, report)
+        report.tokens_after = self.count(result)
+        self.last_report = report
+        self.stats["requests"] += 1
+        self.stats["tokens_before"] += report.tokens_before
+        self.stats["tokens_sent"] += report.tokens_after
+        return result
+
+    def _shrink(self, group: _Group, report: BudgetReport):
+        for j, message in enumerate(group.messages):
+            if message.get("role") == "tool":
+                shrunk = self.preview(message)
+                if shrunk is not message:
+                    group.messages[j] = shrunk
+                    report.shrunk += 1
+
+    async def _fit(self, messages: List[Dict[str, Any]], report: BudgetReport) -> List[Dict[str, Any]]:
+        leading = 0
+        while leading < len(messages) and messages[leading].get("role") == "system":
+            leading += 1
+        system = list(messages[:leading])
+        # Groups folded into the summary by an earlier request stay folded
+        groups: List[Optional[_Group]] = [
+            None if self._is_summarized(group.messages[0]) else group for group in self._group(messages[leading:])
+        ]
+        originals = [list(group.messages) if group is not None else None for group in groups]
+
+        last_user = max((i for i, g in enumerate(groups) if g is not None and g.messages[0].get("role") == "user"),
+                        default=None)
+        protected = set(range(max(0, len(groups) - self.keep_recent), len(groups)))
+        if last_user is not None:
+            protected.add(last_user)
+        older = [i for i in range(len(groups)) if i not in protected and groups[i] is not None]
+
+        def assemble() -> List[Dict[str, Any]]:
+            head = list(system)
+            if self._summary_message is not None:
+                head.append(self._summary_message)
+            return head + [message for group in groups if group is not None for message in group.messages]
+
+        if self.count(assemble()) <= self.max_tokens:
+            return assemble()
+
+        # 1. Shrink tool outputs of older groups to previews, oldest first
+        for i in older:
+            self._shrink(groups[i], report)
+            if self.count(assemble()) <= self.max_tokens:
+                return assemble()
+
+        # 2. Fold (or drop) whole older groups, oldest first
+        evicted = []
+        for i in older:
+            if self.count(assemble()) <= self.max_tokens:
+                break
+            evicted.append(originals[i])
+            groups[i] = None
+        if evicted and self.summarizer is not None:
+            flat = [message for group in evicted for message in group]
+            try:
+                self.summary = await self.summarizer(self.summary, flat)
+            except Exception:
+                # Summarization is best effort; without it the old groups are simply dropped
+                report.dropped += len(evicted)
+            else:
+                self._summary_message = {"role": "system", "content": f"此前对话的摘要：\n{self.summary}"}
+                self._summarized.update((id(message), message) for message in flat)
+                self._forget(flat)
+                report.summarized += len(evicted)
+        else:
+            report.dropped += len(evicted)
+
+        if self.count(assemble()) <= self.max_tokens:
+            return assemble()
+
+        # 3. Still over budget: shrink tool outputs of recent groups too, except the latest one
+        for i in sorted(protected)[:-1]:
+            if groups[i] is not None:
+                self._shrink(groups[i], report)
+        return assemble()
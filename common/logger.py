@@ -1,14 +1,23 @@
 # This module provides a logger for the application.
-# It uses the logging library to create a logger that can be used throughout the application.
-# The logger is configured to log messages to a file and to the console.
+# Records are put on a queue by the calling thread and written by a background listener
+# thread, so file and console I/O never runs on the event loop.
+# The log file rotates by size and by time, and can be written as JSON lines carrying the
+# request and tool-call correlation IDs of the code that emitted each record.
 # The log level can be set to DEBUG, INFO, WARNING, ERROR, or CRITICAL.
 
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
 import os
+import queue
 import sys
-from datetime import datetime
+import time
+import uuid
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
 from dotenv import load_dotenv, find_dotenv
 
 load_dotenv(find_dotenv())
@@ -18,25 +27,162 @@ log_level = os.getenv("LOG_LEVEL", "INFO").upper()
 if log_level not in ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]:
     raise ValueError(f"Invalid log level: {log_level}. Must be one of DEBUG, INFO, WARNING, ERROR, CRITICAL.")
 
+# Format of the log file: "text" or "json" (one JSON object per line)
+log_format = os.getenv("LOG_FORMAT", "text").lower()
+# Rotate the log file once it reaches this many bytes (0 disables size-based rotation)
+log_max_bytes = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+# Rotate the log file at midnight ("midnight") or every N seconds ("0" disables time-based rotation)
+log_rotate_when = os.getenv("LOG_ROTATE_WHEN", "midnight")
+# Number of rotated log files to keep
+log_backup_count = int(os.getenv("LOG_BACKUP_COUNT", "14"))
+# Maximum length of a logged value such as tool arguments
+log_max_arg_chars = int(os.getenv("LOG_MAX_ARG_CHARS", "500"))
+
+LOGGER_NAME = "agent_logger"
+
+# Correlation IDs of the current request / tool call, set by the code handling them.
+# Tasks inherit the values of the context they were created in.
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+tool_call_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("tool_call_id", default=None)
+
+
+def new_request_id() -> str:
+    """
+    Starts a new request in the current context and returns its ID.
+    """
+    request_id = uuid.uuid4().hex[:12]
+    request_id_var.set(request_id)
+    return request_id
+
+
+def truncate_for_log(value: Any, limit: Optional[int] = None) -> str:
+    """
+    Returns a string form of value cut to at most `limit` characters (LOG_MAX_ARG_CHARS by default).
+    """
+    limit = log_max_arg_chars if limit is None else limit
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...({len(text)} chars)"
+
+
+class CorrelationFilter(logging.Filter):
+    """
+    Copies the correlation IDs onto the record in the thread that emitted it.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.tool_call_id = tool_call_id_var.get()
+        ids = [f"req={record.request_id}" if record.request_id else "",
+               f"tool={record.tool_call_id}" if record.tool_call_id else ""]
+        record.correlation = f" [{' '.join(i for i in ids if i)}]" if any(ids) else ""
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as single-line JSON objects.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("request_id", "tool_call_id"):
+            if getattr(record, key, None):
+                entry[key] = getattr(record, key)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.BaseRotatingHandler):
+    """
+    File handler rotating when the file exceeds max_bytes or when the rotation time is reached.
+    Rotated files are renamed with a timestamp suffix and only the newest backup_count are kept.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 0, when: str = "midnight", backup_count: int = 0,
+                 encoding: str = "utf-8"):
+        super().__init__(filename, "a", encoding=encoding, delay=True)
+        self.max_bytes = max_bytes
+        self.when = when
+        self.backup_count = backup_count
+        self.rollover_at = self._next_rollover(time.time())
+
+    def _next_rollover(self, now: float) -> Optional[float]:
+        if self.when == "midnight":
+            tomorrow = datetime.fromtimestamp(now).date() + timedelta(days=1)
+            return datetime.combine(tomorrow, datetime.min.time()).timestamp()
+        interval = float(self.when)
+        return now + interval if interval > 0 else None
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        if self.max_bytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.stream.tell() + len(self.format(record)) + 1 >= self.max_bytes:
+                return True
+        return False
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        base = Path(self.baseFilename)
+        if base.exists() and base.stat().st_size > 0:
+            target = base.with_name(f"{base.name}.{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+            counter = 1
+            while target.exists():
+                target = base.with_name(f"{base.name}.{datetime.now().strftime('%Y%m%d-%H%M%S')}.{counter}")
+                counter += 1
+            self.rotate(str(base), str(target))
+            if self.backup_count > 0:
+                backups = sorted(base.parent.glob(f"{base.name}.*"),
+                                 key=lambda path: (path.stat().st_mtime_ns, len(path.name), path.name))
+                for old in backups[:-self.backup_count]:
+                    old.unlink(missing_ok=True)
+        self.rollover_at = self._next_rollover(time.time())
+        self.stream = self._open()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Returns a child of the application logger, so records go through the same pipeline.
+    """
+    setup_logger()
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
 
 def setup_logger():
     """
     Sets up the logger for the application.
-    The logger will log messages to both a file and the console.
+    The logger will log messages to both a file and the console via a background listener.
+    Calling it again returns the already configured logger without adding handlers.
     """
+    logger = logging.getLogger(LOGGER_NAME)
+    if getattr(logger, "_queue_listener", None) is not None:
+        return logger
+
     # Create a directory for logs if it doesn't exist
     log_dir = Path("logs")
     log_dir.mkdir(parents=True, exist_ok=True)
 
-    # Create a unique log file name based on the current date and time
-    log_file = log_dir / f"{datetime.now().strftime('%Y%m%d')}.log"
-
-    # Create a logger
-    logger = logging.getLogger("agent_logger")
     logger.setLevel(getattr(logging, log_level))
+    # Records are handled only by this pipeline, not again by the root logger
+    logger.propagate = False
 
     # Create file handler
-    file_handler = logging.FileHandler(log_file)
+    file_handler = SizeAndTimeRotatingFileHandler(
+        str(log_dir / ("agent.jsonl" if log_format == "json" else "agent.log")),
+        max_bytes=log_max_bytes, when=log_rotate_when, backup_count=log_backup_count,
+    )
     file_handler.setLevel(getattr(logging, log_level))
 
     # Create console handler
@@ -44,13 +190,26 @@ def setup_logger():
     console_handler.setLevel(getattr(logging, log_level))
 
     # Create formatter and add it to handlers
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(formatter)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s%(correlation)s - %(message)s')
+    file_handler.setFormatter(JsonFormatter() if log_format == "json" else formatter)
     console_handler.setFormatter(formatter)
 
-    # Add handlers to the logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # The calling thread only enqueues; the listener thread does the I/O
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationFilter())
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+
+    def stop_listener():
+        # Flush pending records at exit, unless the listener was already stopped
+        if listener._thread is not None:
+            listener.stop()
+
+    atexit.register(stop_listener)
+
+    logger.addHandler(queue_handler)
+    logger._queue_listener = listener
 
     return logger
 
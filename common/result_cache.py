@@ -0,0 +1,110 @@
+# This module caches results of idempotent MCP tool calls on the client side.
+# Caching is opt-in per tool with a per-tool TTL. Entries live in a size-bounded LRU,
+# and concurrent identical calls are coalesced so they share a single execution.
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+def canonical_arguments(arguments: Optional[Dict[str, Any]]) -> str:
+    """
+    Serializes tool arguments so that equal arguments always give the same key.
+    """
+    return json.dumps(arguments or {}, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def parse_ttls(spec: str) -> Dict[str, float]:
+    """
+    Parses a TTL spec such as "search_bing-search_bing=300,cli-show_security_rules=3600".
+    """
+    ttls = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, ttl = item.rpartition("=")
+        if not name:
+            raise ValueError(f"Invalid cache TTL entry '{item}', expected 'tool_name=seconds'")
+        ttls[name.strip()] = float(ttl)
+    return ttls
+
+
+class ToolResultCache:
+    """
+    TTL + LRU cache for tool results with in-flight request coalescing.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, max_entries: int = 256):
+        """
+        Args:
+            ttls: Exposed tool name -> time to live in seconds. Only these tools are cached.
+            max_entries: Maximum number of cached results across all tools.
+        """
+        self.ttls: Dict[str, float] = dict(ttls or {})
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expired": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def is_cacheable(self, tool_name: str) -> bool:
+        return tool_name in self.ttls
+
+    async def get_or_call(self, tool_name: str, key: Hashable, call: Callable[[], Awaitable[Any]],
+                          should_store: Callable[[Any], bool] = lambda result: result is not None) -> Any:
+        """
+        Returns the cached result for key, or runs call() once and caches its result.
+
+        Args:
+            tool_name: Exposed tool name, used to look up the TTL.
+            key: Cache key, e.g. (server, tool, canonical arguments).
+            call: Coroutine factory performing the real tool call.
+            should_store: Decides whether a result may be cached (errors should not be).
+        """
+        ttl = self.ttls.get(tool_name)
+        if ttl is None:
+            return await call()
+
+        cached = self._entries.get(key)
+        if cached is not None:
+            expires_at, result = cached
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return result
+            del self._entries[key]
+            self.stats["expired"] += 1
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(in_flight)
+
+        self.stats["misses"] += 1
+        task = asyncio.ensure_future(call())
+        self._in_flight[key] = task
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._in_flight.pop(key, None)
+            else:
+                # The caller was cancelled; keep serving coalesced waiters until the call ends
+                task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        if should_store(result):
+            self._store(key, ttl, result)
+        return result
+
+    def _store(self, key: Hashable, ttl: float, result: Any):
+        self._entries[key] = (time.monotonic() + ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,99 @@
+# This module spreads calls to one MCP server across several sessions.
+# A remote (SSE / streamable HTTP) server can serve many connections, and a single session
+# serializes its traffic over one stream; keeping a few sessions open and sending each call
+# to the least busy one lets concurrent tool calls use them in parallel.
+# Sessions whose connection broke are removed (and usually replaced by a new one), and the
+# number of calls in flight is limited per live session, so the limit follows the pool size.
+
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Generic, List, TypeVar
+
+T = TypeVar("T")
+
+
+class SessionPool(Generic[T]):
+    """
+    Hands out the session with the fewest calls in flight, rotating between equally busy ones.
+    """
+
+    def __init__(self, sessions: List[T], max_inflight_per_session: int):
+        """
+        Args:
+            sessions: The open sessions; at least one is required.
+            max_inflight_per_session: Calls allowed in flight per live session; further
+                acquire() calls wait until a call finishes.
+        """
+        if not sessions:
+            raise ValueError("SessionPool needs at least one session")
+        self.sessions = list(sessions)
+        self.max_inflight_per_session = max_inflight_per_session
+        # Keyed by session identity, so removing a session does not shift the others' counts
+        self.inflight: Dict[int, int] = {id(session): 0 for session in self.sessions}
+        self.calls: Dict[int, int] = {id(session): 0 for session in self.sessions}
+        self._rotation = itertools.count()
+        self._available = asyncio.Condition()
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    @property
+    def capacity(self) -> int:
+        """
+        Calls allowed in flight across the live sessions.
+        """
+        return self.max_inflight_per_session * len(self.sessions)
+
+    def _total_inflight(self) -> int:
+        return sum(self.inflight[id(session)] for session in self.sessions)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[T]:
+        """
+        Waits for a free slot and yields the least busy session, counting the call against it
+        until the block exits. Raises ConnectionError if the pool has no live session.
+        """
+        async with self._available:
+            await self._available.wait_for(lambda: not self.sessions or self._total_inflight() < self.capacity)
+            if not self.sessions:
+                raise ConnectionError("SessionPool has no live session")
+            count = len(self.sessions)
+            start = next(self._rotation) % count
+            # min() keeps the first of equally busy sessions, so ties rotate with `start`
+            index = min(((start + i) % count for i in range(count)),
+                        key=lambda i: self.inflight[id(self.sessions[i])])
+            session = self.sessions[index]
+            self.inflight[id(session)] += 1
+            self.calls[id(session)] += 1
+        try:
+            yield session
+        finally:
+            async with self._available:
+                if id(session) in self.inflight:
+                    self.inflight[id(session)] -= 1
+                self._available.notify_all()
+
+    async def add(self, session: T):
+        """
+        Adds a newly opened session and wakes calls waiting for capacity.
+        """
+        async with self._available:
+            self.sessions.append(session)
+            self.inflight[id(session)] = 0
+            self.calls[id(session)] = 0
+            self._available.notify_all()
+
+    async def remove(self, session: T) -> bool:
+        """
+        Removes a session whose connection broke. Returns False if it was already removed.
+        Waiting calls are woken so they fail fast once the pool is empty.
+        """
+        async with self._available:
+            if not any(item is session for item in self.sessions):
+                return False
+            self.sessions = [item for item in self.sessions if item is not session]
+            del self.inflight[id(session)]
+            del self.calls[id(session)]
+            self._available.notify_all()
+            return True
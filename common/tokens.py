@@ -0,0 +1,51 @@
+# This module counts tokens for prompt budgeting and statistics.
+# It uses a local tiktoken encoding when the package (and its encoding file) is available,
+# and otherwise falls back to an approximation: one token per CJK character and roughly
+# one token per four characters of other text.
+
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Any
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+# Encoding used when tiktoken is installed; can be overridden with TOKEN_ENCODING
+encoding_name = os.getenv("TOKEN_ENCODING", "cl100k_base")
+
+_CJK_PATTERN = re.compile(r"[　-〿㐀-䶿一-鿿豈-﫿＀-￯]")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception:
+        # The encoding file may be missing on offline hosts
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Returns the number of tokens in text, exact with tiktoken or approximated otherwise.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def count_json_tokens(value: Any) -> int:
+    """
+    Returns the token count of a JSON-serializable value (e.g. a tool definition).
+    """
+    return count_tokens(json.dumps(value, ensure_ascii=False, default=str))
@@ -0,0 +1,82 @@
+# This module assembles streamed tool-call deltas from the OpenAI chat completions API.
+# A tool call is reported as ready as soon as its JSON arguments are complete, so the
+# agent can start executing it while the model is still emitting the remaining calls.
+
+import json
+from typing import Any, Dict, List
+
+
+class ToolCallAssembler:
+    """
+    Incrementally builds tool calls from `choice.delta.tool_calls` chunks.
+
+    Usage:
+        assembler = ToolCallAssembler()
+        async for chunk in stream:
+            for tool_call in assembler.add(chunk.choices[0].delta.tool_calls):
+                dispatch(tool_call)
+        for tool_call in assembler.finish():
+            dispatch(tool_call)
+        messages.append({"role": "assistant", "tool_calls": assembler.tool_calls, ...})
+    """
+
+    def __init__(self):
+        self._calls: Dict[int, Dict[str, Any]] = {}
+        self._ready: set[int] = set()
+
+    @property
+    def tool_calls(self) -> List[Dict[str, Any]]:
+        """All tool calls seen so far, in the order the model emitted them."""
+        return [self._calls[index] for index in sorted(self._calls)]
+
+    def add(self, tool_call_deltas) -> List[Dict[str, Any]]:
+        """
+        Merges one chunk of tool-call deltas.
+
+        Args:
+            tool_call_deltas: `delta.tool_calls` from a streamed chunk (may be None).
+
+        Returns:
+            List[Dict[str, Any]]: Tool calls that became ready with this chunk.
+        """
+        ready = []
+        for delta in tool_call_deltas or []:
+            index = delta.index
+            if index not in self._calls:
+                # A new call starting means every earlier call has been fully emitted
+                ready.extend(self._mark_ready(i) for i in sorted(self._calls) if i not in self._ready)
+                self._calls[index] = {
+                    "id": None,
+                    "type": "function",
+                    "function": {"name": "", "arguments": ""}
+                }
+            tool_call = self._calls[index]
+            if delta.id:
+                tool_call["id"] = delta.id
+            if delta.function is not None:
+                tool_call["function"]["name"] += delta.function.name or ""
+                tool_call["function"]["arguments"] += delta.function.arguments or ""
+            if index not in self._ready and tool_call["id"] and self._arguments_complete(tool_call):
+                ready.append(self._mark_ready(index))
+        return ready
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """
+        Flushes every tool call not yet reported once the stream has ended.
+        """
+        return [self._mark_ready(index) for index in sorted(self._calls) if index not in self._ready]
+
+    def _mark_ready(self, index: int) -> Dict[str, Any]:
+        self._ready.add(index)
+        return self._calls[index]
+
+    @staticmethod
+    def _arguments_complete(tool_call: Dict[str, Any]) -> bool:
+        arguments = tool_call["function"]["arguments"].rstrip()
+        # Only attempt a parse once the text could close a JSON object
+        if not tool_call["function"]["name"] or not arguments.endswith("}"):
+            return False
+        try:
+            return isinstance(json.loads(arguments), dict)
+        except json.JSONDecodeError:
+            return False
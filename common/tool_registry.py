@@ -0,0 +1,214 @@
+# This module keeps an index of every tool exposed by the connected MCP servers.
+# Tools are looked up by their exposed name ("server_name-tool_name") in O(1), and each
+# entry carries a JSON-schema validator compiled once at registration time so bad
+# arguments from the LLM are rejected locally, without a round trip to the server.
+# The `jsonschema` package is used when installed; otherwise a built-in validator
+# covering the subset of JSON schema that MCP tool inputs use is compiled instead.
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    from jsonschema import validators as jsonschema_validators
+except ImportError:  # pragma: no cover - optional dependency
+    jsonschema_validators = None
+
+# A compiled validator returns an error message, or None if the arguments are valid
+Validator = Callable[[Any], Optional[str]]
+
+_JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "null": type(None),
+}
+
+
+@dataclass
+class RegisteredTool:
+    """
+    A tool exposed to the LLM, together with its owning server and compiled validator.
+    """
+
+    name: str
+    server_name: str
+    tool: Any
+    validator: Validator
+
+    def validate(self, arguments: Any) -> Optional[str]:
+        return self.validator(arguments)
+
+    def to_openai_tool(self) -> Dict[str, Any]:
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.tool.description,
+                "parameters": self.tool.inputSchema,
+                "required": list(self.tool.inputSchema.keys()) if self.tool.inputSchema else []
+            }
+        }
+
+
+class ToolRegistry:
+    """
+    Maps exposed tool names to their server, MCP tool definition and validator.
+    """
+
+    def __init__(self, separator: str = "-"):
+        self.separator = separator
+        self._tools: Dict[str, RegisteredTool] = {}
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def __iter__(self) -> Iterator[RegisteredTool]:
+        return iter(self._tools.values())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def get(self, name: str) -> Optional[RegisteredTool]:
+        return self._tools.get(name)
+
+    def register(self, server_name: str, tools: list) -> List[RegisteredTool]:
+        """
+        Registers the tools of one server.
+
+        Args:
+            server_name (str): Name of the server in the servers config.
+            tools (list): mcp.types.Tool objects returned by list_tools().
+
+        Returns:
+            List[RegisteredTool]: The registered entries, in the order given.
+
+        Raises:
+            ValueError: If an exposed name is already taken by another server's tool.
+        """
+        names = [f"{server_name}{self.separator}{tool.name}" for tool in tools]
+        for name in names:
+            if name in self._tools:
+                raise ValueError(f"Duplicate tool name '{name}' (already registered by '{self._tools[name].server_name}')")
+        if len(set(names)) != len(names):
+            raise ValueError(f"Server '{server_name}' lists the same tool more than once")
+
+        registered = []
+        for name, tool in zip(names, tools):
+            entry = RegisteredTool(name=name, server_name=server_name, tool=tool,
+                                   validator=compile_validator(tool.inputSchema))
+            self._tools[name] = entry
+            registered.append(entry)
+        return registered
+
+    def unregister_server(self, server_name: str):
+        for name in [name for name, entry in self._tools.items() if entry.server_name == server_name]:
+            del self._tools[name]
+
+
+def compile_validator(schema: Optional[Dict[str, Any]]) -> Validator:
+    """
+    Compiles a JSON schema into a validator function.
+
+    Args:
+        schema: The tool's inputSchema. An empty or missing schema accepts any object.
+
+    Returns:
+        Validator: Callable returning an error message, or None when valid.
+    """
+    if not schema:
+        return _compile_subset({"type": "object"}, "arguments")
+    if jsonschema_validators is not None:
+        validator = jsonschema_validators.validator_for(schema)(schema)
+
+        def check(instance):
+            error = next(iter(validator.iter_errors(instance)), None)
+            if error is None:
+                return None
+            location = "/".join(str(part) for part in error.absolute_path) or "arguments"
+            return f"{location}: {error.message}"
+
+        return check
+    return _compile_subset(schema, "arguments")
+
+
+def _compile_subset(schema: Dict[str, Any], location: str) -> Validator:
+    """
+    Compiles the common subset of JSON schema (type, enum, required, properties,
+    additionalProperties, items) into nested closures.
+    """
+    checks: List[Validator] = []
+
+    expected = schema.get("type")
+    if expected is not None:
+        expected_types = expected if isinstance(expected, list) else [expected]
+
+        def check_type(instance):
+            if any(_is_type(instance, t) for t in expected_types):
+                return None
+            return f"{location}: expected {' or '.join(expected_types)}, got {type(instance).__name__}"
+
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = schema["enum"]
+        checks.append(lambda instance: None if instance in allowed else f"{location}: {instance!r} is not one of {allowed}")
+
+    required = schema.get("required", [])
+    properties = {
+        key: _compile_subset(sub_schema, f"{location}.{key}" if location != "arguments" else key)
+        for key, sub_schema in schema.get("properties", {}).items()
+        if isinstance(sub_schema, dict)
+    }
+    additional = schema.get("additionalProperties", True)
+    if required or properties or additional is False:
+        def check_object(instance):
+            if not isinstance(instance, dict):
+                return None
+            for key in required:
+                if key not in instance:
+                    return f"{location}: missing required property '{key}'"
+            for key, value in instance.items():
+                sub_check = properties.get(key)
+                if sub_check is not None:
+                    error = sub_check(value)
+                    if error:
+                        return error
+                elif additional is False:
+                    return f"{location}: unexpected property '{key}'"
+            return None
+
+        checks.append(check_object)
+
+    items = schema.get("items")
+    if isinstance(items, dict):
+        item_check = _compile_subset(items, f"{location}[]")
+
+        def check_items(instance):
+            if not isinstance(instance, list):
+                return None
+            for item in instance:
+                error = item_check(item)
+                if error:
+                    return error
+            return None
+
+        checks.append(check_items)
+
+    def check(instance):
+        for sub_check in checks:
+            error = sub_check(instance)
+            if error:
+                return error
+        return None
+
+    return check
+
+
+def _is_type(instance: Any, json_type: str) -> bool:
+    if json_type == "integer":
+        return isinstance(instance, int) and not isinstance(instance, bool)
+    if json_type == "number":
+        return isinstance(instance, (int, float)) and not isinstance(instance, bool)
+    python_type = _JSON_TYPES.get(json_type)
+    return python_type is None or isinstance(instance, python_type)
@@ -0,0 +1,121 @@
+# This module selects the tools relevant to a query so each LLM request only carries
+# the definitions it needs. It builds an offline BM25 index over tool names, descriptions
+# and parameter names/descriptions when servers connect. Chinese text is indexed as
+# character unigrams and bigrams, other text as lowercase words.
+
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from common.tokens import count_json_tokens
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+|[一-鿿]+")
+_CJK_PATTERN = re.compile(r"[一-鿿]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into BM25 terms: lowercase ASCII words and CJK unigrams/bigrams.
+    """
+    terms = []
+    for word in _WORD_PATTERN.findall(text.lower()):
+        if _CJK_PATTERN.fullmatch(word):
+            terms.extend(word)
+            terms.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            terms.append(word)
+    return terms
+
+
+def _tool_document(entry) -> str:
+    parts = [entry.name.replace("-", " ").replace("_", " "), entry.tool.description or ""]
+    schema = entry.tool.inputSchema or {}
+    for key, prop in schema.get("properties", {}).items():
+        parts.append(key.replace("_", " "))
+        if isinstance(prop, dict):
+            parts.append(str(prop.get("description", "")))
+    return " ".join(parts)
+
+
+class ToolRetriever:
+    """
+    BM25 retriever over the tools of a ToolRegistry.
+    """
+
+    def __init__(self, registry, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.stats: Dict[str, int] = {"requests": 0, "tokens_full": 0, "tokens_sent": 0, "tokens_saved": 0}
+        self.last_tokens_saved = 0
+        self.index(registry)
+
+    def index(self, registry):
+        """
+        (Re)builds the index from every tool in the registry.
+        """
+        self._entries = list(registry)
+        self._openai_tools = [entry.to_openai_tool() for entry in self._entries]
+        self._positions = {entry.name: i for i, entry in enumerate(self._entries)}
+        self._tool_tokens = [count_json_tokens(tool) for tool in self._openai_tools]
+        self._total_tokens = sum(self._tool_tokens)
+
+        self._postings: Dict[str, List[tuple]] = defaultdict(list)
+        self._doc_lengths: List[int] = []
+        for i, entry in enumerate(self._entries):
+            terms = Counter(tokenize(_tool_document(entry)))
+            self._doc_lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                self._postings[term].append((i, frequency))
+
+        count = len(self._entries)
+        self._avg_length = (sum(self._doc_lengths) / count) if count else 0.0
+        self._idf = {
+            term: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    def search(self, query: str, top_k: int) -> List[str]:
+        """
+        Returns the names of the top_k tools ranked by BM25 score (score > 0 only).
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for i, frequency in self._postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[i] / (self._avg_length or 1))
+                scores[i] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        ranked = sorted(scores, key=lambda i: (-scores[i], i))[:top_k]
+        return [self._entries[i].name for i in ranked]
+
+    def select(self, query: str, top_k: int, used: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Picks the OpenAI tool definitions to send with one completion request.
+
+        Args:
+            query (str): The user query.
+            top_k (int): How many tools to retrieve; all tools are sent when there are no more
+                than this, or when no tool matches the query.
+            used (Iterable[str]): Tool names already called in this conversation; always included.
+
+        Returns:
+            List[Dict[str, Any]]: Tool definitions, in registry order.
+        """
+        if len(self._entries) <= top_k:
+            positions = range(len(self._entries))
+        else:
+            names = set(self.search(query, top_k))
+            names.update(name for name in used or [] if name in self._positions)
+            # Nothing matched: send everything rather than leave the model without tools
+            positions = sorted(self._positions[name] for name in names) if names else range(len(self._entries))
+
+        tools = [self._openai_tools[i] for i in positions]
+        sent = sum(self._tool_tokens[i] for i in positions)
+        self.stats["requests"] += 1
+        self.stats["tokens_full"] += self._total_tokens
+        self.stats["tokens_sent"] += sent
+        self.stats["tokens_saved"] += self._total_tokens - sent
+        self.last_tokens_saved = self._total_tokens - sent
+        return tools
@@ -0,0 +1,250 @@
+# This module provides lightweight span tracing for latency analysis.
+# Spans nest through a context variable, so tasks created inside a span become its children.
+# Finished spans are handed to an exporter running on a background thread: a JSON-lines file,
+# or an OTLP/HTTP (JSON encoding) collector such as `benchmark/trace_report.py collect`.
+# Tracing is disabled unless TRACE_EXPORT is set, in which case spans cost almost nothing.
+
+import atexit
+import contextvars
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# "jsonl" or "otlp"; empty disables tracing
+trace_export = os.getenv("TRACE_EXPORT", "").lower()
+trace_file = os.getenv("TRACE_FILE", os.path.join("logs", "traces.jsonl"))
+trace_otlp_endpoint = os.getenv("TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces")
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "agent-llm-mcp")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """
+    Stand-in returned when tracing is disabled.
+    """
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+class JsonlExporter:
+    """
+    Appends spans to a JSON-lines file.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def export(self, spans: List[Span]):
+        for span in spans:
+            self._file.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: List[Span]) -> Dict[str, Any]:
+    """
+    Encodes spans as an OTLP/HTTP JSON ExportTraceServiceRequest.
+    """
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": "common.tracing"},
+                "spans": [{
+                    "traceId": span.trace_id,
+                    "spanId": span.span_id,
+                    "parentSpanId": span.parent_id or "",
+                    "name": span.name,
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns),
+                    "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+                    "status": {"code": 1 if span.status == "ok" else 2},
+                } for span in spans],
+            }],
+        }],
+    }
+
+
+class OtlpHttpExporter:
+    """
+    Posts batches of spans to an OTLP/HTTP collector using the JSON encoding.
+    """
+
+    def __init__(self, endpoint: str, timeout: float = 5):
+        import httpx
+
+        self.endpoint = endpoint
+        self._client = httpx.Client(timeout=timeout)
+
+    def export(self, spans: List[Span]):
+        try:
+            self._client.post(self.endpoint, json=to_otlp(spans))
+        except Exception:
+            # Tracing must never break the traced code; spans of an unreachable collector are lost
+            pass
+
+    def close(self):
+        self._client.close()
+
+
+class Tracer:
+    """
+    Creates spans and exports finished ones in batches from a background thread.
+    """
+
+    def __init__(self, exporter=None, batch_size: int = 256, flush_interval: float = 1.0):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.SimpleQueue[Optional[Span]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        if exporter is not None:
+            self._thread = threading.Thread(target=self._export_loop, name="span-exporter", daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Any]:
+        """
+        Times the enclosed block as a child of the current span.
+        """
+        if self.exporter is None:
+            yield _NOOP_SPAN
+            return
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent is not None else uuid.uuid4().hex,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.span_id if parent is not None else None,
+            start_ns=time.time_ns(),
+            attributes=attributes,
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.attributes.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            self._queue.put(span)
+
+    def record(self, name: str, start_ns: int, end_ns: int, **attributes):
+        """
+        Records an already measured interval (e.g. a wait) as a child of the current span.
+        """
+        if self.exporter is None:
+            return
+        parent = _current_span.get()
+        self._queue.put(Span(
+            name=name,
+            trace_id=parent.trace_id if parent is not None else uuid.uuid4().hex,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.span_id if parent is not None else None,
+            start_ns=start_ns,
+            end_ns=end_ns,
+            attributes=attributes,
+        ))
+
+    def _export_loop(self):
+        running = True
+        while running:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if span is None:
+                    running = False
+                    break
+                batch.append(span)
+            if batch:
+                self.exporter.export(batch)
+
+    def shutdown(self):
+        """
+        Exports the remaining spans and stops the exporter thread.
+        """
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._thread = None
+        self.exporter.close()
+
+
+def create_tracer() -> Tracer:
+    if trace_export == "jsonl":
+        return Tracer(JsonlExporter(trace_file))
+    if trace_export == "otlp":
+        return Tracer(OtlpHttpExporter(trace_otlp_endpoint))
+    return Tracer()
+
+
+tracer = create_tracer()
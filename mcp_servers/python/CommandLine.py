@@ -1,16 +1,20 @@
 import os
 import re
-import shlex
+import json
 import asyncio
 import subprocess
-from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Dict, List, Optional
 
 import mcp.server.stdio
 import mcp.types as types
 from mcp.server import NotificationOptions, Server
 from mcp.server.models import InitializationOptions
 
+from async_process import OutputCallback, ProcessResult, stream_process
+from command_cache import ReadOnlyCommandCache, can_mmap, mmap_cat
+from command_policy import CommandPolicy, PolicyViolation
+
 server = Server("cli-mcp-server")
 
 
@@ -50,6 +54,13 @@ class SecurityConfig:
     command_timeout: int
     allow_all_commands: bool = False
     allow_all_flags: bool = False
+    max_concurrent_commands: int = 4
+    output_head_bytes: int = 32 * 1024
+    output_tail_bytes: int = 32 * 1024
+    read_only_commands: set[str] = field(default_factory=set)
+    command_cache_size: int = 128
+    command_flags: dict[str, set[str]] = field(default_factory=dict)
+    command_arg_patterns: dict[str, str] = field(default_factory=dict)
 
 
 class CommandExecutor:
@@ -58,27 +69,28 @@ class CommandExecutor:
             raise ValueError("Valid ALLOWED_DIR is required")
         self.allowed_dir = os.path.abspath(os.path.realpath(allowed_dir))
         self.security_config = security_config
+        self.policy = CommandPolicy.from_config(security_config, self.allowed_dir)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.result_cache = ReadOnlyCommandCache(self.allowed_dir, max_entries=security_config.command_cache_size)
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """
+        Limits concurrently running commands; waiting requests are served in arrival order.
+        Created lazily so it binds to the server's running event loop.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.security_config.max_concurrent_commands)
+        return self._semaphore
 
     def _normalize_path(self, path: str) -> str:
         """
         Normalizes a path and ensures it's within allowed directory.
         """
         try:
-            if os.path.isabs(path):
-                # If absolute path, check directly
-                real_path = os.path.abspath(os.path.realpath(path))
-            else:
-                # If relative path, combine with allowed_dir first
-                real_path = os.path.abspath(os.path.realpath(os.path.join(self.allowed_dir, path)))
-
-            if not self._is_path_safe(real_path):
-                raise CommandSecurityError(f"Path '{path}' is outside of allowed directory: {self.allowed_dir}")
-
-            return real_path
-        except CommandSecurityError:
-            raise
-        except Exception as e:
-            raise CommandSecurityError(f"Invalid path '{path}': {str(e)}")
+            return self.policy.normalize_path(path)
+        except PolicyViolation as e:
+            raise CommandSecurityError(str(e))
 
     def validate_command(self, command_string: str) -> tuple[str, List[str]]:
         """
@@ -86,6 +98,7 @@ class CommandExecutor:
 
         Checks the command string for unsupported shell operators and splits it into
         command and arguments. Only single commands without shell operators are allowed.
+        Validation is done by the CommandPolicy compiled from the security config.
 
         Args:
             command_string (str): The command string to validate and parse.
@@ -96,47 +109,13 @@ class CommandExecutor:
                 - List of command arguments (List[str])
 
         Raises:
-            CommandSecurityError: If the command contains unsupported shell operators.
+            CommandSecurityError: If the command contains unsupported shell operators,
+                or a command, flag, argument or path that the policy does not allow.
         """
-
-        # Check for shell operators that we don't support
-        shell_operators = ["&&", "||", "|", ">", ">>", "<", "<<", ";"]
-        for operator in shell_operators:
-            if operator in command_string:
-                raise CommandSecurityError(f"Shell operator '{operator}' is not supported")
-
         try:
-            parts = shlex.split(command_string)
-            if not parts:
-                raise CommandSecurityError("Empty command")
-
-            command, args = parts[0], parts[1:]
-
-            # Validate command if not in allow-all mode
-            if not self.security_config.allow_all_commands and command not in self.security_config.allowed_commands:
-                raise CommandSecurityError(f"Command '{command}' is not allowed")
-
-            # Process and validate arguments
-            validated_args = []
-            for arg in args:
-                if arg.startswith("-"):
-                    if not self.security_config.allow_all_flags and arg not in self.security_config.allowed_flags:
-                        raise CommandSecurityError(f"Flag '{arg}' is not allowed")
-                    validated_args.append(arg)
-                    continue
-
-                # For any path-like argument, validate it
-                if "/" in arg or "\\" in arg or os.path.isabs(arg) or arg == ".":
-                    normalized_path = self._normalize_path(arg)
-                    validated_args.append(normalized_path)
-                else:
-                    # For non-path arguments, add them as-is
-                    validated_args.append(arg)
-
-            return command, validated_args
-
-        except ValueError as e:
-            raise CommandSecurityError(f"Invalid command format: {str(e)}")
+            return self.policy.validate(command_string)
+        except PolicyViolation as e:
+            raise CommandSecurityError(str(e))
 
     def _is_path_safe(self, path: str) -> bool:
         """
@@ -155,16 +134,23 @@ class CommandExecutor:
         Private method intended for internal use only.
         """
         try:
-            # Resolve any symlinks and get absolute path
-            real_path = os.path.abspath(os.path.realpath(path))
-            allowed_dir_real = os.path.abspath(os.path.realpath(self.allowed_dir))
-
-            # Check if the path starts with allowed_dir
-            return real_path.startswith(allowed_dir_real)
+            return self.policy.is_within_root(self.policy.resolve(path))
         except Exception:
             return False
 
-    def execute(self, command_string: str) -> subprocess.CompletedProcess:
+    def _can_serve_directly(self, paths: List[str]) -> bool:
+        """
+        Checks whether `cat` can be answered by reading the files in-process: every path
+        must resolve inside the allowed directory and be a readable regular file. Anything
+        else falls back to the real command so error messages stay unchanged.
+
+        The paths come from the cached resolution in validate_command; they are re-resolved
+        here without the cache, so a component replaced by a symlink since then (e.g. by a
+        snippet of the python worker) is not followed out of the allowed directory.
+        """
+        return all(self.policy.is_still_resolved(path) for path in paths) and can_mmap(paths)
+
+    async def execute(self, command_string: str, on_output: Optional[OutputCallback] = None) -> ProcessResult:
         """
         Executes a command string in a secure, controlled environment.
 
@@ -173,10 +159,12 @@ class CommandExecutor:
 
         Args:
             command_string (str): The command string to execute.
+            on_output (OutputCallback): Optional coroutine called with each chunk of output
+                as it is read, e.g. to send progress notifications.
 
         Returns:
-            subprocess.CompletedProcess: The result of the command execution containing
-                stdout, stderr, and return code.
+            ProcessResult: The result of the command execution containing stdout, stderr,
+                return code and the number of output bytes dropped by the head/tail caps.
 
         Raises:
             CommandSecurityError: If the command:
@@ -184,26 +172,65 @@ class CommandExecutor:
                 - Contains invalid shell operators
                 - Fails security validation
                 - Fails during execution
+            CommandTimeoutError: If the command exceeds the configured timeout.
 
         Notes:
             - Executes with shell=False for security
-            - Uses timeout and working directory constraints
-            - Captures both stdout and stderr
+            - Runs as an asyncio subprocess so other requests are served meanwhile
+            - At most max_concurrent_commands run at once; the rest queue in order
+            - On timeout the whole process group is killed
+            - Reads stdout and stderr incrementally, keeping only the first
+              output_head_bytes and last output_tail_bytes of each in memory
+            - Results of read_only_commands are cached, keyed on the normalized argv and
+              the mtime/ctime/size of the referenced paths, so changed files miss the cache
+            - `cat` (when read-only) is served via mmap without forking a process
         """
         if len(command_string) > self.security_config.max_command_length:
             raise CommandSecurityError(f"Command exceeds maximum length of {self.security_config.max_command_length}")
 
         try:
             command, args = self.validate_command(command_string)
+            argv = [command] + args
+
+            def run() -> Awaitable[ProcessResult]:
+                return stream_process(
+                    argv,
+                    timeout=self.security_config.command_timeout,
+                    cwd=self.allowed_dir,
+                    semaphore=self.semaphore,
+                    on_output=on_output,
+                    head_bytes=self.security_config.output_head_bytes,
+                    tail_bytes=self.security_config.output_tail_bytes,
+                )
 
-            return subprocess.run(
-                [command] + args,
-                shell=False,
-                text=True,
-                capture_output=True,
-                timeout=self.security_config.command_timeout,
-                cwd=self.allowed_dir,
-            )
+            if command not in self.security_config.read_only_commands:
+                # The command may change the filesystem (e.g. create a symlink), so
+                # cached path resolutions are dropped once it finishes
+                try:
+                    return await run()
+                finally:
+                    self.policy.invalidate_paths()
+
+            if command == "cat":
+                paths = self.result_cache.referenced_paths(args)
+                if not all(self.policy.is_still_resolved(path) for path in paths):
+                    # A cached resolution may be stale (a component replaced by a symlink),
+                    # so the command is validated again against the filesystem as it is now
+                    self.policy.invalidate_paths()
+                    command, args = self.validate_command(command_string)
+                    argv = [command] + args
+                    paths = self.result_cache.referenced_paths(args)
+                if not any(arg.startswith("-") for arg in args) and self._can_serve_directly(paths):
+                    return await asyncio.to_thread(
+                        mmap_cat, argv, paths,
+                        self.security_config.output_head_bytes, self.security_config.output_tail_bytes,
+                    )
+                return await run()
+
+            if self.security_config.command_cache_size <= 0 or not self.result_cache.is_cacheable(args):
+                return await run()
+            fingerprint = await asyncio.to_thread(self.result_cache.fingerprint, args)
+            return await self.result_cache.get_or_run(argv, fingerprint, run)
         except subprocess.TimeoutExpired:
             raise CommandTimeoutError(f"Command timed out after {self.security_config.command_timeout} seconds")
         except CommandError:
@@ -229,15 +256,31 @@ def load_security_config() -> SecurityConfig:
             - command_timeout: Maximum execution time in seconds
             - allow_all_commands: Whether all commands are allowed
             - allow_all_flags: Whether all flags are allowed
+            - max_concurrent_commands: Maximum number of commands running at once
+            - output_head_bytes / output_tail_bytes: Output kept from the start / end of each stream
+            - read_only_commands: Commands whose results are cached (cat is served via mmap)
+            - command_cache_size: Maximum number of cached command results
+            - command_flags: Extra flags allowed for specific commands
+            - command_arg_patterns: Regex that non-flag arguments of a command must fully match
 
     Environment Variables:
         ALLOWED_COMMANDS: Comma-separated list of allowed commands or 'all' (default: "ls,cat,pwd")
         ALLOWED_FLAGS: Comma-separated list of allowed flags or 'all' (default: "-l,-a,--help")
         MAX_COMMAND_LENGTH: Maximum command string length (default: 1024)
         COMMAND_TIMEOUT: Command timeout in seconds (default: 30)
+        MAX_CONCURRENT_COMMANDS: Maximum number of commands running at once (default: 4)
+        OUTPUT_HEAD_BYTES: Bytes kept from the start of stdout/stderr (default: 32768)
+        OUTPUT_TAIL_BYTES: Bytes kept from the end of stdout/stderr (default: 32768)
+        READ_ONLY_COMMANDS: Comma-separated list of side-effect free commands (default: "ls,cat,pwd")
+        COMMAND_CACHE_SIZE: Maximum number of cached command results, 0 disables (default: 128)
+        COMMAND_FLAGS: JSON object mapping a command to its extra allowed flags,
+            e.g. '{"grep": ["-n", "-i"]}' (default: none)
+        COMMAND_ARG_PATTERNS: JSON object mapping a command to an argument regex,
+            e.g. '{"grep": "[\\w. -]+"}' (default: none)
     """
     allowed_commands = os.getenv("ALLOWED_COMMANDS", "ls,cat,pwd")
     allowed_flags = os.getenv("ALLOWED_FLAGS", "-l,-a,--help")
+    read_only_commands = os.getenv("READ_ONLY_COMMANDS", "ls,cat,pwd")
     
     allow_all_commands = allowed_commands.lower() == 'all'
     allow_all_flags = allowed_flags.lower() == 'all'
@@ -249,12 +292,75 @@ def load_security_config() -> SecurityConfig:
         command_timeout=int(os.getenv("COMMAND_TIMEOUT", "30")),
         allow_all_commands=allow_all_commands,
         allow_all_flags=allow_all_flags,
+        max_concurrent_commands=int(os.getenv("MAX_CONCURRENT_COMMANDS", "4")),
+        output_head_bytes=int(os.getenv("OUTPUT_HEAD_BYTES", str(32 * 1024))),
+        output_tail_bytes=int(os.getenv("OUTPUT_TAIL_BYTES", str(32 * 1024))),
+        read_only_commands={cmd for cmd in read_only_commands.split(",") if cmd},
+        command_cache_size=int(os.getenv("COMMAND_CACHE_SIZE", "128")),
+        command_flags={cmd: set(flags) for cmd, flags in json.loads(os.getenv("COMMAND_FLAGS") or "{}").items()},
+        command_arg_patterns=json.loads(os.getenv("COMMAND_ARG_PATTERNS") or "{}"),
     )
 
 
 executor = CommandExecutor(allowed_dir=os.getenv("ALLOWED_DIR", ""), security_config=load_security_config())
 
 
+class ProgressReporter:
+    """
+    Streams command output to the client as MCP progress notifications.
+
+    Notifications carry the number of output bytes read so far as `progress`, and the
+    output read since the previous notification (capped) as `message`. They are sent at
+    most every `interval` seconds so chatty commands do not flood the client.
+    """
+
+    def __init__(self, session, progress_token: types.ProgressToken, interval: float = 0.25, max_message_chars: int = 4096):
+        self.session = session
+        self.progress_token = progress_token
+        self.interval = interval
+        self.max_message_chars = max_message_chars
+        self.bytes_read = 0
+        self._pending = bytearray()
+        self._last_sent = 0.0
+
+    async def on_output(self, stream: str, data: bytes):
+        self.bytes_read += len(data)
+        if len(self._pending) < self.max_message_chars:
+            self._pending += data[:self.max_message_chars - len(self._pending)]
+        now = asyncio.get_running_loop().time()
+        if now - self._last_sent >= self.interval:
+            await self.flush()
+
+    async def flush(self):
+        if not self._pending and self._last_sent:
+            return
+        self._last_sent = asyncio.get_running_loop().time()
+        message = self._pending.decode("utf-8", errors="replace")
+        self._pending.clear()
+        await self.session.send_notification(
+            types.ServerNotification(
+                types.ProgressNotification(
+                    method="notifications/progress",
+                    params=types.ProgressNotificationParams(
+                        progressToken=self.progress_token,
+                        progress=self.bytes_read,
+                        message=message,
+                    ),
+                )
+            )
+        )
+
+
+def create_progress_reporter() -> Optional[ProgressReporter]:
+    """
+    Returns a reporter for the current request if the client asked for progress.
+    """
+    ctx = server.request_context
+    if ctx.meta is None or ctx.meta.progressToken is None:
+        return None
+    return ProgressReporter(ctx.session, ctx.meta.progressToken)
+
+
 @server.list_tools()
 async def handle_list_tools() -> list[types.Tool]:
     commands_desc = "all commands" if executor.security_config.allow_all_commands else ", ".join(executor.security_config.allowed_commands)
@@ -298,7 +404,10 @@ async def handle_call_tool(name: str, arguments: Optional[Dict[str, Any]]) -> Li
             return [types.TextContent(type="text", text="No command provided", error=True)]
 
         try:
-            result = executor.execute(arguments["command"])
+            reporter = create_progress_reporter()
+            result = await executor.execute(arguments["command"], on_output=reporter.on_output if reporter else None)
+            if reporter is not None:
+                await reporter.flush()
 
             response = []
             if result.stdout:
@@ -306,18 +415,19 @@ async def handle_call_tool(name: str, arguments: Optional[Dict[str, Any]]) -> Li
             if result.stderr:
                 response.append(types.TextContent(type="text", text=result.stderr, error=True))
 
-            response.append(
-                types.TextContent(
-                    type="text",
-                    text=f"\nCommand completed with return code: {result.returncode}",
+            status = f"\nCommand completed with return code: {result.returncode}"
+            if result.truncated_bytes:
+                status += (
+                    f" ({result.truncated_bytes} of {result.stdout_bytes + result.stderr_bytes} "
+                    f"output bytes truncated)"
                 )
-            )
+            response.append(types.TextContent(type="text", text=status))
 
             return response
 
         except CommandSecurityError as e:
             return [types.TextContent(type="text", text=f"Security violation: {str(e)}", error=True)]
-        except subprocess.TimeoutExpired:
+        except CommandTimeoutError:
             return [
                 types.TextContent(
                     type="text",
@@ -347,6 +457,15 @@ async def handle_call_tool(name: str, arguments: Optional[Dict[str, Any]]) -> Li
             f"Max Command Length: {executor.security_config.max_command_length} characters\n"
             f"Command Timeout: {executor.security_config.command_timeout} seconds\n"
         )
+        if executor.security_config.command_flags or executor.security_config.command_arg_patterns:
+            security_info += "\nPer-command Rules:\n-----------------\n"
+            for command in sorted(set(executor.security_config.command_flags) | set(executor.security_config.command_arg_patterns)):
+                rules = []
+                if command in executor.security_config.command_flags:
+                    rules.append("flags: " + ", ".join(sorted(executor.security_config.command_flags[command])))
+                if command in executor.security_config.command_arg_patterns:
+                    rules.append(f"arguments: {executor.security_config.command_arg_patterns[command]}")
+                security_info += f"{command}: {'; '.join(rules)}\n"
         return [types.TextContent(type="text", text=security_info)]
 
     raise ValueError(f"Unknown tool: {name}")
@@ -368,5 +487,5 @@ async def main():
         )
 
 
-if __name__ == "__main":
+if __name__ == "__main__":
     asyncio.run(main())
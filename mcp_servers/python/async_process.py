@@ -0,0 +1,146 @@
+import os
+import signal
+import asyncio
+import subprocess
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+
+# 每次从管道读取的字节数
+READ_CHUNK_BYTES = 64 * 1024
+
+
+def kill_process_group(process: asyncio.subprocess.Process):
+    """杀掉进程及其所在进程组(子进程以 start_new_session=True 启动时即其全部后代)"""
+    if process.returncode is not None:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+
+
+class HeadTailBuffer:
+    """只保留输出开头 head_bytes 与结尾 tail_bytes 字节的缓冲区，内存占用有上限"""
+
+    def __init__(self, head_bytes: int, tail_bytes: int):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data):
+        """写入数据，data 可以是 bytes 或 memoryview(如 mmap 的视图)，只会复制需要保留的部分"""
+        self.total += len(data)
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if len(data) and self.tail_bytes > 0:
+            if len(data) >= self.tail_bytes:
+                self.tail = bytearray(data[len(data) - self.tail_bytes:])
+            else:
+                self.tail += data
+                if len(self.tail) > self.tail_bytes:
+                    del self.tail[:len(self.tail) - self.tail_bytes]
+
+    @property
+    def truncated(self) -> int:
+        """被丢弃的字节数"""
+        return self.total - len(self.head) - len(self.tail)
+
+    def getvalue(self) -> str:
+        head = self.head.decode("utf-8", errors="replace")
+        if not self.tail:
+            return head
+        tail = self.tail.decode("utf-8", errors="replace")
+        if self.truncated:
+            return f"{head}\n... [{self.truncated} bytes truncated] ...\n{tail}"
+        return head + tail
+
+
+@dataclass
+class ProcessResult:
+    argv: List[str]
+    returncode: int
+    stdout: str
+    stderr: str
+    stdout_bytes: int
+    stderr_bytes: int
+    truncated_bytes: int
+
+
+# 输出回调: (流名称 'stdout'/'stderr', 新读到的数据)
+OutputCallback = Callable[[str, bytes], Awaitable[None]]
+
+
+async def stream_process(argv: List[str], timeout: float, cwd: Optional[str] = None,
+                         semaphore: Optional[asyncio.Semaphore] = None,
+                         on_output: Optional[OutputCallback] = None,
+                         head_bytes: int = 32 * 1024, tail_bytes: int = 32 * 1024) -> ProcessResult:
+    """以异步子进程执行命令，边运行边增量读取输出，不阻塞事件循环
+
+    Args:
+        argv (list): 命令及参数
+        timeout (float): 超时时间(秒)，超时后杀掉整个进程组
+        cwd (str): 工作目录
+        semaphore (asyncio.Semaphore): 限制同时运行的进程数量，等待者按先后顺序排队
+        on_output (callable): 每读到一段输出时调用
+        head_bytes (int): stdout/stderr 各自保留的开头字节数
+        tail_bytes (int): stdout/stderr 各自保留的结尾字节数
+
+    Raises:
+        subprocess.TimeoutExpired: 执行超时
+    """
+    if semaphore is None:
+        return await _stream(argv, timeout, cwd, on_output, head_bytes, tail_bytes)
+    async with semaphore:
+        return await _stream(argv, timeout, cwd, on_output, head_bytes, tail_bytes)
+
+
+async def _stream(argv, timeout, cwd, on_output, head_bytes, tail_bytes) -> ProcessResult:
+    process = await asyncio.create_subprocess_exec(
+        *argv,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=cwd,
+        start_new_session=True,
+    )
+    buffers = {"stdout": HeadTailBuffer(head_bytes, tail_bytes), "stderr": HeadTailBuffer(head_bytes, tail_bytes)}
+
+    async def pump(name: str, stream: asyncio.StreamReader):
+        while True:
+            data = await stream.read(READ_CHUNK_BYTES)
+            if not data:
+                return
+            buffers[name].write(data)
+            if on_output is not None:
+                await on_output(name, data)
+
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(pump("stdout", process.stdout), pump("stderr", process.stderr), process.wait()),
+            timeout=timeout,
+        )
+    except asyncio.TimeoutError:
+        kill_process_group(process)
+        await process.wait()
+        raise subprocess.TimeoutExpired(argv, timeout)
+    except BaseException:
+        kill_process_group(process)
+        await process.wait()
+        raise
+    stdout, stderr = buffers["stdout"], buffers["stderr"]
+    return ProcessResult(
+        argv=argv,
+        returncode=process.returncode,
+        stdout=stdout.getvalue(),
+        stderr=stderr.getvalue(),
+        stdout_bytes=stdout.total,
+        stderr_bytes=stderr.total,
+        truncated_bytes=stdout.truncated + stderr.truncated,
+    )
@@ -0,0 +1,96 @@
+import os
+from typing import Callable, Dict, List, Optional
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        HTMLParser = None
+
+try:
+    import lxml  # noqa: F401
+    BS4_FEATURES = "lxml"
+except ImportError:
+    BS4_FEATURES = "html.parser"
+
+# 每条结果摘要保留的最大字符数
+MAX_SNIPPET_CHARS = int(os.getenv("BING_MAX_SNIPPET_CHARS", "300"))
+
+# 只构建结果列表部分的文档树，跳过页面头部脚本与样式
+_RESULTS_ONLY = SoupStrainer(id="b_results")
+
+
+def _truncate(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+def _make_item(title: Optional[str], snippet: Optional[str], link: Optional[str], limit: int) -> Optional[Dict[str, str]]:
+    if not title or not snippet or not link:
+        return None
+    return {"title": title.strip(), "snippet": _truncate(snippet, limit), "link": link}
+
+
+def extract_with_selectolax(html: str, max_snippet_chars: int = MAX_SNIPPET_CHARS) -> List[Dict[str, str]]:
+    """使用 selectolax 解析搜索结果"""
+    data = []
+    for parent in HTMLParser(html).css("#b_results > li"):
+        h2 = parent.css_first("h2")
+        if h2 is None:
+            continue
+        caption = parent.css_first("div.b_caption > p")
+        anchor = parent.css_first("div.b_tpcn > a") or h2.css_first("a")
+        item = _make_item(h2.text(), caption.text() if caption is not None else None,
+                          anchor.attributes.get("href") if anchor is not None else None, max_snippet_chars)
+        if item is not None:
+            data.append(item)
+    return data
+
+
+def extract_with_bs4(html: str, max_snippet_chars: int = MAX_SNIPPET_CHARS) -> List[Dict[str, str]]:
+    """使用 BeautifulSoup 解析搜索结果，只解析结果列表并对每条结果只查找一次各字段"""
+    soup = BeautifulSoup(html, BS4_FEATURES, parse_only=_RESULTS_ONLY)
+    results = soup.find(id="b_results")
+    if results is None:
+        return []
+    data = []
+    for parent in results.find_all("li", recursive=False):
+        h2 = parent.find("h2")
+        if h2 is None:
+            continue
+        caption = parent.select_one("div.b_caption > p")
+        anchor = parent.select_one("div.b_tpcn > a") or h2.find("a")
+        item = _make_item(h2.get_text(), caption.get_text() if caption is not None else None,
+                          anchor.get("href") if anchor is not None else None, max_snippet_chars)
+        if item is not None:
+            data.append(item)
+    return data
+
+
+BACKENDS: Dict[str, Callable[..., List[Dict[str, str]]]] = {"bs4": extract_with_bs4}
+if HTMLParser is not None:
+    BACKENDS["selectolax"] = extract_with_selectolax
+
+# 默认使用已安装的最快解析后端，可通过环境变量 BING_PARSER 指定
+DEFAULT_BACKEND = os.getenv("BING_PARSER", "selectolax" if HTMLParser is not None else "bs4")
+
+
+def extract_results(html: str, backend: Optional[str] = None, max_snippet_chars: int = MAX_SNIPPET_CHARS) -> List[Dict[str, str]]:
+    """解析搜索结果页面，缺少标题、摘要或链接的条目会被跳过
+
+    Args:
+        html (str): 搜索结果页面
+        backend (str): 解析后端 'selectolax' 或 'bs4'，默认使用 DEFAULT_BACKEND
+        max_snippet_chars (int): 摘要保留的最大字符数
+
+    Returns:
+        list: [{"title", "snippet", "link"}]
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"解析后端 {backend} 不可用，可选: {', '.join(BACKENDS)}")
+    return BACKENDS[backend](html, max_snippet_chars)
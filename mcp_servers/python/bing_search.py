@@ -0,0 +1,81 @@
+import os
+import asyncio
+from typing import Optional
+
+import httpx
+
+import bing_parser
+
+# 搜索地址，可通过环境变量指向本地桩服务器以便离线测试
+SERPER_URL = os.getenv("BING_URL", "https://cn.bing.com/")
+HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/54.0.2840.99 Safari/537.36"}
+
+# 同时进行的页面请求数量上限
+MAX_CONCURRENT_REQUESTS = int(os.getenv("BING_MAX_CONCURRENCY", "8"))
+# 请求超时时间(秒)
+REQUEST_TIMEOUT = float(os.getenv("BING_TIMEOUT", "10"))
+
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """获取进程内共享的异步 HTTP 客户端，复用 keep-alive 连接池
+
+    客户端在首次使用时创建并在进程生命周期内保持，SSE server 的多个会话共用同一个连接池
+    """
+    global _client, _semaphore
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=httpx.Timeout(REQUEST_TIMEOUT),
+            limits=httpx.Limits(max_connections=MAX_CONCURRENT_REQUESTS,
+                                max_keepalive_connections=MAX_CONCURRENT_REQUESTS),
+            follow_redirects=True,
+        )
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    return _client
+
+
+async def fetch_results_page(search_keywords: str) -> str:
+    """请求搜索结果页面"""
+    client = get_client()
+    async with _semaphore:
+        response = await client.get(SERPER_URL, params={"q": search_keywords})
+    response.raise_for_status()
+    return response.text
+
+
+def parse_results(html: str) -> list:
+    """解析搜索结果页面"""
+    return bing_parser.extract_results(html)
+
+
+async def search(search_keywords: str) -> list:
+    """查询并返回结果列表，页面解析放到线程中执行，不阻塞事件循环"""
+    html = await fetch_results_page(search_keywords)
+    return await asyncio.to_thread(parse_results, html)
+
+
+async def search_many(queries: list) -> dict:
+    """并发查询多个关键词，按链接合并去重，并记录每条结果来自哪些关键词
+
+    Returns:
+        dict: {"results": [{"title", "snippet", "link", "queries"}], "errors": {关键词: 错误信息}}
+    """
+    queries = list(dict.fromkeys(q for q in queries if q))
+    outcomes = await asyncio.gather(*[search(q) for q in queries], return_exceptions=True)
+
+    merged = {}
+    errors = {}
+    for query, outcome in zip(queries, outcomes):
+        if isinstance(outcome, BaseException):
+            errors[query] = str(outcome) or type(outcome).__name__
+            continue
+        for item in outcome:
+            key = item["link"] or item["title"]
+            if key in merged:
+                merged[key]["queries"].append(query)
+            else:
+                merged[key] = {**item, "queries": [query]}
+    return {"results": list(merged.values()), "errors": errors}
@@ -0,0 +1,129 @@
+"""
+只读命令的结果缓存
+
+对配置为只读的命令(如 ls、pwd)，以规范化后的 argv 加上所引用路径的 mtime/ctime/size 作为缓存键，
+文件或目录发生变化时指纹随之改变，缓存自动失效，无需显式清除。
+cat 不启动子进程，直接通过 mmap 读取文件，只复制输出上限内的开头与结尾部分。
+"""
+import os
+import mmap
+import stat
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Tuple
+
+from async_process import HeadTailBuffer, ProcessResult
+
+# 会递归访问子目录的参数，指纹只覆盖一层目录，带这些参数的命令不缓存
+RECURSIVE_FLAGS = {"-R", "--recursive"}
+
+
+def _stat_key(st: os.stat_result) -> Tuple[int, int, int, int]:
+    return (st.st_mode, st.st_mtime_ns, st.st_ctime_ns, st.st_size)
+
+
+def path_fingerprint(path: str) -> tuple:
+    """路径的指纹：文件取自身的 stat，目录还包括其直接子项的 stat，不存在的路径记为 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (path, None)
+    if not stat.S_ISDIR(st.st_mode):
+        return (path, _stat_key(st))
+    entries = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    entries.append((entry.name, _stat_key(entry.stat(follow_symlinks=False))))
+                except OSError:
+                    entries.append((entry.name, None))
+    except OSError:
+        return (path, _stat_key(st), None)
+    entries.sort()
+    return (path, _stat_key(st), tuple(entries))
+
+
+class ReadOnlyCommandCache:
+    """按 argv 保存只读命令的结果，命中时比较路径指纹，指纹变化即视为失效"""
+
+    def __init__(self, cwd: str, max_entries: int = 128):
+        """
+        Args:
+            cwd (str): 命令的工作目录，没有路径参数的命令以该目录作为引用路径
+            max_entries (int): 最多缓存的结果数量，超出时淘汰最久未使用的条目
+        """
+        self.cwd = cwd
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Tuple[tuple, ProcessResult]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def referenced_paths(self, args: List[str]) -> List[str]:
+        paths = [arg if os.path.isabs(arg) else os.path.join(self.cwd, arg) for arg in args if not arg.startswith("-")]
+        return paths or [self.cwd]
+
+    def fingerprint(self, args: List[str]) -> tuple:
+        return tuple(path_fingerprint(path) for path in self.referenced_paths(args))
+
+    @staticmethod
+    def is_cacheable(args: List[str]) -> bool:
+        return not any(arg in RECURSIVE_FLAGS for arg in args)
+
+    async def get_or_run(self, argv: List[str], fingerprint: tuple,
+                         run: Callable[[], Awaitable[ProcessResult]]) -> ProcessResult:
+        """返回缓存的结果；未命中或指纹已变化时执行 run 并以执行前取得的指纹保存结果
+
+        执行期间文件若被修改，下次取得的指纹与保存的不同，不会返回过期结果
+        """
+        key = tuple(argv)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] == fingerprint:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            del self._entries[key]
+            self.stats["invalidations"] += 1
+        self.stats["misses"] += 1
+
+        result = await run()
+        self._entries[key] = (fingerprint, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+        return result
+
+    def clear(self):
+        self._entries.clear()
+
+
+def can_mmap(paths: List[str]) -> bool:
+    """所有路径都是可读的普通文件时才能直接读取，否则交给 cat 处理以得到原样的报错"""
+    for path in paths:
+        try:
+            if not stat.S_ISREG(os.stat(path).st_mode) or not os.access(path, os.R_OK):
+                return False
+        except OSError:
+            return False
+    return bool(paths)
+
+
+def mmap_cat(argv: List[str], paths: List[str], head_bytes: int, tail_bytes: int) -> ProcessResult:
+    """不启动子进程，通过 mmap 依次读取文件，与 cat 输出相同，只复制开头与结尾需要保留的部分"""
+    buffer = HeadTailBuffer(head_bytes, tail_bytes)
+    for path in paths:
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                continue
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    buffer.write(view)
+    return ProcessResult(
+        argv=argv,
+        returncode=0,
+        stdout=buffer.getvalue(),
+        stderr="",
+        stdout_bytes=buffer.total,
+        stderr_bytes=0,
+        truncated_bytes=buffer.truncated,
+    )
@@ -0,0 +1,156 @@
+"""
+命令校验策略
+
+SecurityConfig 在启动时编译为 CommandPolicy：shell 操作符用一个正则一次扫描，
+不含引号与反斜杠的命令直接按空白切分、其余才交给 shlex，允许的参数、每个命令单独的参数白名单
+与参数格式均预先编译，允许目录只解析一次，路径前缀比较以路径分隔符为界，路径解析结果带缓存。
+缓存条目在 path_cache_ttl 秒后过期，其他进程将路径中的目录替换为符号链接后，旧的解析结果最多再被信任这么久；
+不经子进程直接读取文件前，应再用 is_still_resolved 不经缓存确认一次。
+"""
+import os
+import re
+import shlex
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 不支持的 shell 操作符，长的放在前面以便报错时给出完整的操作符
+SHELL_OPERATORS = re.compile(r"&&|\|\||>>|<<|\||>|<|;")
+# 出现引号、反斜杠或 shlex 不视为分隔符的空白时，才需要 shlex 做完整的词法分析
+_NEEDS_SHLEX = re.compile(r"[\"'\\]|[^\S \t\r\n]")
+
+
+class PolicyViolation(Exception):
+    """命令不符合策略"""
+
+
+class CommandPolicy:
+    """编译后的命令校验策略"""
+
+    def __init__(self, root: str, allowed_commands: Iterable[str], allowed_flags: Iterable[str],
+                 allow_all_commands: bool = False, allow_all_flags: bool = False,
+                 command_flags: Optional[Dict[str, Iterable[str]]] = None,
+                 command_arg_patterns: Optional[Dict[str, str]] = None,
+                 path_cache_size: int = 1024, path_cache_ttl: float = 2.0):
+        """
+        Args:
+            root (str): 允许访问的目录
+            allowed_commands (iterable): 允许的命令
+            allowed_flags (iterable): 所有命令都允许的参数
+            allow_all_commands (bool): 是否允许所有命令
+            allow_all_flags (bool): 是否允许所有参数
+            command_flags (dict): 命令 -> 该命令额外允许的参数
+            command_arg_patterns (dict): 命令 -> 非参数(如文件名、搜索词)必须完整匹配的正则
+            path_cache_size (int): 路径解析缓存的条目数量
+            path_cache_ttl (float): 路径解析缓存条目的有效期(秒)
+        """
+        self.root = os.path.realpath(root)
+        self._root_prefix = self.root.rstrip(os.sep) + os.sep
+        self.allowed_commands = frozenset(allowed_commands)
+        self.allow_all_commands = allow_all_commands
+        self.allow_all_flags = allow_all_flags
+        global_flags = frozenset(allowed_flags)
+        self._global_flags = global_flags
+        self._flags = {command: global_flags | frozenset(flags) for command, flags in (command_flags or {}).items()}
+        self._arg_patterns = {command: re.compile(pattern) for command, pattern in (command_arg_patterns or {}).items()}
+        self.path_cache_size = path_cache_size
+        self.path_cache_ttl = path_cache_ttl
+        # 路径 -> (解析结果, 过期时间)
+        self._resolved: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    @classmethod
+    def from_config(cls, config, root: str) -> "CommandPolicy":
+        """由 SecurityConfig 编译策略"""
+        return cls(
+            root=root,
+            allowed_commands=config.allowed_commands,
+            allowed_flags=config.allowed_flags,
+            allow_all_commands=config.allow_all_commands,
+            allow_all_flags=config.allow_all_flags,
+            command_flags=config.command_flags,
+            command_arg_patterns=config.command_arg_patterns,
+        )
+
+    @staticmethod
+    def tokenize(command_string: str) -> List[str]:
+        """检查 shell 操作符并切分命令"""
+        operator = SHELL_OPERATORS.search(command_string)
+        if operator is not None:
+            raise PolicyViolation(f"Shell operator '{operator.group()}' is not supported")
+        if _NEEDS_SHLEX.search(command_string) is None:
+            return command_string.split()
+        try:
+            return shlex.split(command_string)
+        except ValueError as e:
+            raise PolicyViolation(f"Invalid command format: {str(e)}")
+
+    def is_within_root(self, real_path: str) -> bool:
+        """real_path 需已解析；以路径分隔符为界比较，/data/allowed2 不属于 /data/allowed"""
+        return real_path == self.root or real_path.startswith(self._root_prefix)
+
+    def resolve(self, path: str) -> str:
+        """解析路径中的符号链接，相对路径基于允许目录，结果带有效期为 path_cache_ttl 的 LRU 缓存"""
+        now = time.monotonic()
+        cached = self._resolved.get(path)
+        if cached is not None and cached[1] > now:
+            self._resolved.move_to_end(path)
+            return cached[0]
+        real_path = os.path.realpath(path if os.path.isabs(path) else os.path.join(self.root, path))
+        self._resolved[path] = (real_path, now + self.path_cache_ttl)
+        self._resolved.move_to_end(path)
+        if len(self._resolved) > self.path_cache_size:
+            self._resolved.popitem(last=False)
+        return real_path
+
+    def is_still_resolved(self, real_path: str) -> bool:
+        """不经缓存确认已解析的路径仍不含符号链接且位于允许目录内"""
+        try:
+            return os.path.realpath(real_path) == real_path and self.is_within_root(real_path)
+        except (OSError, ValueError):
+            return False
+
+    def invalidate_paths(self):
+        """清空路径解析缓存；执行过可能修改文件系统(如创建符号链接)的命令后调用"""
+        self._resolved.clear()
+
+    def normalize_path(self, path: str) -> str:
+        """解析路径并确认其位于允许目录内"""
+        try:
+            real_path = self.resolve(path)
+        except (OSError, ValueError) as e:
+            raise PolicyViolation(f"Invalid path '{path}': {str(e)}")
+        if not self.is_within_root(real_path):
+            raise PolicyViolation(f"Path '{path}' is outside of allowed directory: {self.root}")
+        return real_path
+
+    def validate(self, command_string: str) -> Tuple[str, List[str]]:
+        """校验并切分命令，返回命令与参数，路径参数替换为解析后的绝对路径"""
+        parts = self.tokenize(command_string)
+        if not parts:
+            raise PolicyViolation("Empty command")
+
+        command, args = parts[0], parts[1:]
+        if not self.allow_all_commands and command not in self.allowed_commands:
+            raise PolicyViolation(f"Command '{command}' is not allowed")
+
+        flags = self._flags.get(command, self._global_flags)
+        pattern = self._arg_patterns.get(command)
+        validated_args = []
+        for arg in args:
+            if arg.startswith("-"):
+                if not self.allow_all_flags and arg not in flags:
+                    raise PolicyViolation(f"Flag '{arg}' is not allowed")
+                validated_args.append(arg)
+                continue
+
+            if pattern is not None and pattern.fullmatch(arg) is None:
+                raise PolicyViolation(f"Argument '{arg}' is not allowed for command '{command}'")
+
+            # 不含分隔符的参数若是允许目录中已存在的条目(可能是指向目录外的符号链接)，同样按路径解析
+            if ("/" in arg or "\\" in arg or arg == "." or arg == ".."
+                    or os.path.lexists(os.path.join(self.root, arg))):
+                validated_args.append(self.normalize_path(arg))
+            else:
+                validated_args.append(arg)
+
+        return command, validated_args
@@ -1,21 +1,41 @@
-import subprocess
+import os
+from contextlib import asynccontextmanager
 from mcp.server.fastmcp import FastMCP
 
+from py_worker_pool import PythonWorkerPool
+
+# worker 进程数量、预先导入的模块、每个 worker 执行次数上限与单次执行超时(秒)
+pool = PythonWorkerPool(
+    size=int(os.getenv("PY_POOL_SIZE", "2")),
+    preload=os.getenv("PY_PRELOAD", "").split(","),
+    max_runs_per_worker=int(os.getenv("PY_MAX_RUNS", "50")),
+    timeout=float(os.getenv("PY_TIMEOUT", "10")),
+)
+
+
+@asynccontextmanager
+async def lifespan(server):
+    """server 启动时预热 worker 进程，退出时关闭"""
+    await pool.start()
+    try:
+        yield
+    finally:
+        await pool.close()
+
+
 USER_AGENT = "EXECUTE_PYTHON"
-mcp_server = FastMCP(USER_AGENT)
+mcp_server = FastMCP(USER_AGENT, lifespan=lifespan)
 
 @mcp_server.tool(name="execute_python_code", description="执行python代码")
 async def execute_python_code(code: str) -> str:
     try:
-        process = subprocess.run(['python', '-c', code], capture_output=True, text=True, timeout=10)
+        process = await pool.run(code)
+        if process.timed_out:
+            return "Error: Python code execution timed out."
         if process.returncode == 0:
             return process.stdout.strip()
         else:
             return f"Error: {process.stderr.strip()}"
-    except subprocess.TimeoutExpired:
-        return "Error: Python code execution timed out."
-    except FileNotFoundError:
-        return "Error: Python interpreter not found."
     except Exception as e:
         return f"Error: {e}"
 
@@ -0,0 +1,237 @@
+"""
+预热的 Python 解释器进程池
+
+每个 worker 进程启动时预先导入配置的模块(如 numpy、pandas)，之后循环接收代码片段，
+在全新的命名空间中执行，并按次捕获 stdout/stderr。worker 执行 N 次后、超时或崩溃时会被替换。
+
+父进程与 worker 之间通过复制出的私有文件描述符按行传递 JSON；
+fd 0 指向 /dev/null；执行期间 fd 1/2 指向临时文件，执行之间指向 /dev/null，
+代码片段遗留的线程或子进程在执行结束后的输出被丢弃，不会写入协议。
+每次执行后恢复工作目录与环境变量，代码片段的 os.chdir / os.environ 修改不影响之后的执行。
+"""
+import os
+import sys
+import json
+import asyncio
+import builtins
+import importlib
+import tempfile
+import traceback
+from dataclasses import dataclass
+from typing import List, Optional
+
+from async_process import kill_process_group
+
+# 单次执行捕获输出的最大字节数
+MAX_OUTPUT_BYTES = 1024 * 1024
+# 协议单行长度上限：stdout/stderr 各 MAX_OUTPUT_BYTES，JSON 转义后每字节最多变为 6 字节
+PROTOCOL_LINE_LIMIT = 2 * 6 * MAX_OUTPUT_BYTES + 64 * 1024
+
+
+@dataclass
+class RunResult:
+    stdout: str
+    stderr: str
+    returncode: int
+    timed_out: bool = False
+
+
+class PythonWorker:
+    """单个 worker 进程"""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.runs = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def execute(self, code: str) -> dict:
+        self.runs += 1
+        self.process.stdin.write((json.dumps({"code": code}) + "\n").encode("utf-8"))
+        await self.process.stdin.drain()
+        line = await self.process.stdout.readline()
+        if not line:
+            raise RuntimeError("worker 进程意外退出")
+        return json.loads(line)
+
+    async def kill(self):
+        """杀掉 worker 及代码片段启动的全部子进程"""
+        kill_process_group(self.process)
+        await self.process.wait()
+
+
+class PythonWorkerPool:
+    """预热 worker 进程池，空闲 worker 按先到先得分配给等待中的请求"""
+
+    def __init__(self, size: int = 2, preload: Optional[List[str]] = None, max_runs_per_worker: int = 50,
+                 timeout: float = 10, python: str = sys.executable):
+        """
+        Args:
+            size (int): worker 进程数量，即同时执行的代码片段数量上限
+            preload (list): worker 启动时预先导入的模块
+            max_runs_per_worker (int): worker 执行多少次后被替换，避免状态在多次执行间累积
+            timeout (float): 单次执行超时时间(秒)，超时的 worker 会被杀掉并替换
+            python (str): 用于启动 worker 的解释器
+        """
+        self.size = size
+        self.preload = [name for name in (preload or []) if name]
+        self.max_runs_per_worker = max_runs_per_worker
+        self.timeout = timeout
+        self.python = python
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._workers: set = set()
+        self._background: set = set()
+        self._closed = False
+
+    async def start(self):
+        """启动并预热全部 worker"""
+        await asyncio.gather(*[self._spawn() for _ in range(self.size)])
+
+    async def _spawn(self):
+        process = await asyncio.create_subprocess_exec(
+            self.python, "-u", os.path.abspath(__file__), "--worker", ",".join(self.preload),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            start_new_session=True,
+            limit=PROTOCOL_LINE_LIMIT,
+        )
+        worker = PythonWorker(process)
+        self._workers.add(worker)
+        ready = await process.stdout.readline()
+        if not ready:
+            self._workers.discard(worker)
+            await worker.kill()
+            raise RuntimeError("worker 进程启动失败")
+        if self._closed:
+            self._workers.discard(worker)
+            await worker.kill()
+            return
+        self._idle.put_nowait(worker)
+
+    def _replace(self, worker: PythonWorker):
+        """杀掉 worker 并在后台启动新的 worker 补充到池中"""
+        self._workers.discard(worker)
+
+        async def replace():
+            await worker.kill()
+            if not self._closed:
+                await self._spawn()
+
+        task = asyncio.create_task(replace())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def run(self, code: str) -> RunResult:
+        """在空闲 worker 中执行代码片段"""
+        if not self._workers and not self._background:
+            raise RuntimeError("没有可用的 worker 进程")
+        worker = await self._idle.get()
+        try:
+            result = await asyncio.wait_for(worker.execute(code), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._replace(worker)
+            return RunResult(stdout="", stderr="", returncode=-1, timed_out=True)
+        except BaseException:
+            self._replace(worker)
+            raise
+        if worker.runs >= self.max_runs_per_worker or not worker.alive:
+            self._replace(worker)
+        else:
+            self._idle.put_nowait(worker)
+        return RunResult(stdout=result["stdout"], stderr=result["stderr"], returncode=result["returncode"])
+
+    async def close(self):
+        self._closed = True
+        for task in list(self._background):
+            task.cancel()
+        await asyncio.gather(*[worker.kill() for worker in list(self._workers)], return_exceptions=True)
+        self._workers.clear()
+
+
+def _read_capped(file) -> str:
+    file.seek(0)
+    data = file.read(MAX_OUTPUT_BYTES + 1)
+    text = data[:MAX_OUTPUT_BYTES].decode("utf-8", errors="replace")
+    if len(data) > MAX_OUTPUT_BYTES:
+        text += "\n... (output truncated)"
+    return text
+
+
+def _run_snippet(code: str) -> dict:
+    """在全新的命名空间中执行代码，捕获 fd 级别的 stdout/stderr；结束后恢复 fd、工作目录与环境变量"""
+    saved_cwd = os.getcwd()
+    saved_environ = dict(os.environ)
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        # 执行之间 fd 1/2 指向 /dev/null(见 worker_main)，结束后恢复为 /dev/null 而不是协议管道
+        saved_stdout, saved_stderr = os.dup(1), os.dup(2)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(out.fileno(), 1)
+        os.dup2(err.fileno(), 2)
+        returncode = 0
+        try:
+            exec(compile(code, "<string>", "exec"), {"__name__": "__main__", "__builtins__": builtins})
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                returncode = e.code
+            elif e.code is not None:
+                print(e.code, file=sys.stderr)
+                returncode = 1
+        except BaseException as e:
+            # 去掉 worker 自身的栈帧，与 `python -c` 的报错保持一致
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+            returncode = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved_stdout, 1)
+            os.dup2(saved_stderr, 2)
+            os.close(saved_stdout)
+            os.close(saved_stderr)
+            try:
+                os.chdir(saved_cwd)
+            except OSError:
+                pass
+            if os.environ != saved_environ:
+                os.environ.clear()
+                os.environ.update(saved_environ)
+        return {"stdout": _read_capped(out), "stderr": _read_capped(err), "returncode": returncode}
+
+
+def worker_main(preload: List[str]):
+    """worker 进程入口"""
+    # 与 `python -c` 保持一致：当前目录优先导入，argv 只含 '-c'
+    sys.path[0] = ""
+    sys.argv = ["-c"]
+    protocol_in = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    protocol_out = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"preload {name} failed: {e}", file=sys.stderr)
+
+    # 协议已复制到私有 fd，fd 1/2 改指向 /dev/null，执行之外的输出不会进入协议
+    sys.stdout.flush()
+    sys.stderr.flush()
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    os.close(devnull)
+
+    protocol_out.write(json.dumps({"ready": True}) + "\n")
+    protocol_out.flush()
+    for line in protocol_in:
+        request = json.loads(line)
+        protocol_out.write(json.dumps(_run_snippet(request["code"])) + "\n")
+        protocol_out.flush()
+
+
+if __name__ == "__main__" and len(sys.argv) >= 2 and sys.argv[1] == "--worker":
+    worker_main([name for name in sys.argv[2].split(",") if name] if len(sys.argv) > 2 else [])
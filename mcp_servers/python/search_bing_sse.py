@@ -1,6 +1,6 @@
 from mcp.server.fastmcp import FastMCP
-import requests
-from bs4 import BeautifulSoup
+
+import bing_search
 
 USER_AGENT = "SearchBing-SSE"
 
@@ -13,26 +13,17 @@ settings = {
 
 mcp_server = FastMCP(USER_AGENT, **settings)
 
-SERPER_URL = "https://cn.bing.com/"
-
 
 @mcp_server.tool(name="search_bing", description="通过浏览器查询")
 async def search_bing(search_keywords: str):
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/54.0.2840.99 Safari/537.36"}
-    response = requests.get(f"{SERPER_URL}?q={search_keywords}", headers=headers)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    result_elements = soup.select("#b_results > li")
-    data = []
-    for parent in result_elements:
-        if parent.select_one('h2') is None:
-            continue
-        data.append({
-            "title": parent.select_one('h2').text,
-            'snippet': parent.select_one('div.b_caption > p').text,
-            'link': parent.select_one('div.b_tpcn > a').get('href')
-        })
+    data = await bing_search.search(search_keywords)
     return [data]
 
 
+@mcp_server.tool(name="search_bing_many", description="一次查询多个关键词，结果按链接合并去重并标注来源关键词")
+async def search_bing_many(search_keywords_list: list[str]):
+    return await bing_search.search_many(search_keywords_list)
+
+
 if __name__ == "__main__":
     mcp_server.run(transport='sse')
@@ -0,0 +1,162 @@
+"""
+基于 SQLite 的会话消息历史，供 serve.py 使用
+
+- 每条消息一行，按会话与序号保存；每次请求从数据库加载历史，运行结束后只追加本轮新增的消息
+- 每个会话只保留最近 max_messages 条消息，裁剪从某条用户消息处开始，不会留下缺少 tool_calls 的工具结果
+- 会话按最后更新时间过期，或在数量超出上限时移除最久未更新的会话
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Collection, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversations_updated ON conversations (updated);
+CREATE TABLE IF NOT EXISTS messages (
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (conversation_id, seq)
+);
+"""
+
+
+class ConversationHistory:
+    """将会话消息保存在 SQLite 文件中"""
+
+    def __init__(self, path: str, max_messages: int = 100):
+        """
+        Args:
+            path (str): 数据库文件路径，':memory:' 表示不落盘
+            max_messages (int): 每个会话保留的消息数量，0 表示不限制；单轮对话超出上限时保留该轮全部消息
+        """
+        self.path = path
+        self.max_messages = max_messages
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """首次使用时才打开数据库"""
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def load(self, conversation_id: str) -> list:
+        """按顺序读取会话的全部消息，会话不存在时返回空列表"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT message FROM messages WHERE conversation_id=? ORDER BY seq", (conversation_id,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def append(self, conversation_id: str, messages: list):
+        """追加消息并更新会话的最后更新时间，超出 max_messages 时裁剪最早的消息"""
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN")
+            try:
+                last = conn.execute(
+                    "SELECT MAX(seq) FROM messages WHERE conversation_id=?", (conversation_id,)
+                ).fetchone()[0]
+                start = 0 if last is None else last + 1
+                conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?)", [
+                    (conversation_id, start + i, message.get("role", ""), json.dumps(message, ensure_ascii=False))
+                    for i, message in enumerate(messages)
+                ])
+                conn.execute("INSERT OR REPLACE INTO conversations VALUES (?, ?)", (conversation_id, time.time()))
+                self._trim(conversation_id, start + len(messages) - 1)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _trim(self, conversation_id: str, last: int):
+        if self.max_messages <= 0:
+            return
+        # 保留的消息从最近 max_messages 条中最早的用户消息开始；没有时保留最后一轮
+        first = self.conn.execute(
+            "SELECT MIN(seq) FROM messages WHERE conversation_id=? AND role='user' AND seq>?",
+            (conversation_id, last - self.max_messages),
+        ).fetchone()[0]
+        if first is None:
+            first = self.conn.execute(
+                "SELECT MAX(seq) FROM messages WHERE conversation_id=? AND role='user'", (conversation_id,)
+            ).fetchone()[0]
+        if first is not None:
+            self.conn.execute("DELETE FROM messages WHERE conversation_id=? AND seq<?", (conversation_id, first))
+
+    def delete(self, conversation_id: str) -> bool:
+        """删除会话，返回会话是否存在"""
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN")
+            try:
+                deleted = conn.execute("DELETE FROM conversations WHERE id=?", (conversation_id,)).rowcount
+                conn.execute("DELETE FROM messages WHERE conversation_id=?", (conversation_id,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return deleted > 0
+
+    def expire(self, max_conversations: int, ttl: float, keep: Collection[str] = ()) -> int:
+        """删除超过 ttl 秒未更新的会话，以及超出 max_conversations 的最久未更新的会话(keep 中的除外)，返回删除数量"""
+        with self._lock:
+            conn = self.conn
+            rows = conn.execute("SELECT id, updated FROM conversations ORDER BY updated DESC").fetchall()
+            cutoff = time.time() - ttl
+            stale = [conversation_id for index, (conversation_id, updated) in enumerate(rows)
+                     if (index >= max_conversations or updated < cutoff) and conversation_id not in keep]
+            if not stale:
+                return 0
+            conn.execute("BEGIN")
+            try:
+                conn.executemany("DELETE FROM conversations WHERE id=?", [(item,) for item in stale])
+                conn.executemany("DELETE FROM messages WHERE conversation_id=?", [(item,) for item in stale])
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return len(stale)
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+    # 异步接口在线程中执行，磁盘读写不阻塞事件循环
+
+    async def aload(self, conversation_id: str) -> list:
+        return await asyncio.to_thread(self.load, conversation_id)
+
+    async def aappend(self, conversation_id: str, messages: list):
+        await asyncio.to_thread(self.append, conversation_id, messages)
+
+    async def adelete(self, conversation_id: str) -> bool:
+        return await asyncio.to_thread(self.delete, conversation_id)
+
+    async def aexpire(self, max_conversations: int, ttl: float, keep: Collection[str] = ()) -> int:
+        return await asyncio.to_thread(self.expire, max_conversations, ttl, keep)
+
+    async def acount(self) -> int:
+        return await asyncio.to_thread(self.count)
@@ -1,8 +1,54 @@
+import os
+
+from langgraph.checkpoint.base import empty_checkpoint
 from langgraph.checkpoint.memory import MemorySaver
 
+from memory.sqlite_saver import SqliteSaver
+
+# 检查点数据库路径，设为 'memory' 时使用进程内的 MemorySaver
+MEMORY_DB = os.getenv("MEMORY_DB", os.path.join("data", "checkpoints.sqlite"))
+# 每个会话保留的检查点数量
+MEMORY_MAX_CHECKPOINTS = int(os.getenv("MEMORY_MAX_CHECKPOINTS", "50"))
+
 
-def create_memory():
+def create_memory(path: str = MEMORY_DB, max_checkpoints_per_thread: int = MEMORY_MAX_CHECKPOINTS):
     """
     上下文记忆
+
+    默认保存在 SQLite 文件中(WAL 模式、增量写入、每个会话限制检查点数量)，进程重启后仍可恢复会话
     """
-    return MemorySaver()
+    if path == "memory":
+        return MemorySaver()
+    return SqliteSaver(path, max_checkpoints_per_thread=max_checkpoints_per_thread)
+
+
+# 检查点中保存消息历史的通道名
+MESSAGES_CHANNEL = "messages"
+
+
+def _thread_config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+
+
+async def load_history(checkpointer, thread_id: str) -> list:
+    """读取会话最新检查点中的消息历史，会话不存在时返回空列表"""
+    checkpoint_tuple = await checkpointer.aget_tuple(_thread_config(thread_id))
+    if checkpoint_tuple is None:
+        return []
+    return list(checkpoint_tuple.checkpoint["channel_values"].get(MESSAGES_CHANNEL, []))
+
+
+async def save_history(checkpointer, thread_id: str, messages: list):
+    """将一轮对话后的消息历史保存为会话的新检查点"""
+    config = _thread_config(thread_id)
+    latest = await checkpointer.aget_tuple(config)
+    previous_version = latest.checkpoint["channel_versions"].get(MESSAGES_CHANNEL) if latest else None
+    version = checkpointer.get_next_version(previous_version, None)
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {MESSAGES_CHANNEL: list(messages)}
+    checkpoint["channel_versions"] = {MESSAGES_CHANNEL: version}
+    if latest is not None:
+        config["configurable"]["checkpoint_id"] = latest.checkpoint["id"]
+    metadata = {"source": "loop", "step": latest.metadata.get("step", -1) + 1 if latest else 0,
+                "writes": None, "parents": {}}
+    await checkpointer.aput(config, checkpoint, metadata, {MESSAGES_CHANNEL: version})
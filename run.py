@@ -1,12 +1,24 @@
 import os
+import sys
 import json
+import time
 import asyncio
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
 
 from dotenv import load_dotenv, find_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 from MCP_StdioClient_2 import MCPClient
-from common.logger import logger
+from common.artifact_store import ARTIFACT_TOOLS, HANDLE_PREFIX, ArtifactStore
+from common.context_budget import ContextBudget
+from common.logger import logger, new_request_id, tool_call_id_var
+from common.result_cache import parse_ttls
+from common.tokens import count_json_tokens, count_tokens
+from common.tool_call_assembler import ToolCallAssembler
+from common.tracing import tracer
+from memory.memory import create_memory, load_history, save_history
 
 # 加载 .env 文件，确保 API Key 受到保护
 load_dotenv(find_dotenv())
@@ -14,76 +26,359 @@ load_dotenv(find_dotenv())
 base_url = os.getenv("BASE_URL")
 api_key = os.getenv("API_KEY")
 llm_model_name = os.getenv("MODEL")
+# 流式请求时要求服务在最后一个 chunk 中返回 token 用量(stream_options.include_usage)，不支持该参数的服务可关闭
+llm_stream_usage = os.getenv("LLM_STREAM_USAGE", "true").lower() in ("1", "true", "yes")
+# 单次对话中最多进行的工具调用轮数；达到上限后再进行一次不带工具的LLM调用生成最终回答，即LLM调用最多 MAX_AGENT_STEPS + 1 次
+max_agent_steps = int(os.getenv("MAX_AGENT_STEPS", "8"))
+# 每次请求最多携带的检索工具数量，工具总数不超过该值时全部发送
+tool_top_k = int(os.getenv("TOOL_TOP_K", "8"))
+# 需要缓存结果的幂等工具及缓存有效期，例如 "search_bing-search_bing=300"
+tool_cache_ttls = parse_ttls(os.getenv("TOOL_CACHE_TTLS", ""))
+# 每次请求发送的消息历史 token 上限，超出时较早的工具结果被截断为预览，再折叠或丢弃较早的步骤
+context_max_tokens = int(os.getenv("CONTEXT_MAX_TOKENS", "24000"))
+# 完整保留的最近消息组(用户消息 / 一轮模型回复及其工具结果)数量
+context_keep_recent = int(os.getenv("CONTEXT_KEEP_RECENT", "4"))
+# 较早的工具结果截断后保留的 token 数
+context_preview_tokens = int(os.getenv("CONTEXT_PREVIEW_TOKENS", "200"))
+# 是否调用模型将被移出上下文的步骤滚动总结为摘要(会增加一次模型调用)
+context_summarize = os.getenv("CONTEXT_SUMMARIZE", "false").lower() in ("1", "true", "yes")
+# 超过 ARTIFACT_INLINE_BYTES 的工具结果保存到 ARTIFACT_DIR，对话中只保留标识与预览
+artifact_store = ArtifactStore(
+    os.getenv("ARTIFACT_DIR", os.path.join(".cache", "artifacts")),
+    inline_limit_bytes=int(os.getenv("ARTIFACT_INLINE_BYTES", "8192")),
+    preview_bytes=int(os.getenv("ARTIFACT_PREVIEW_BYTES", "1024")),
+)
 
+# 使用的 MCP server：名称 -> 脚本路径(相对于本文件所在目录)
+servers_list = {
+    "exec_py": "./mcp_servers/python/exec_py.py",
+    "search_bing": "./mcp_servers/python/search_bing.py",
+    "exec_js": "./mcp_servers/js/exec_js.js"
+}
 
-async def run_agent(llm, mcp_client, query):
-    messages = []
-    messages.append({"role": "user", "content": query})
+
+@dataclass
+class AgentResult:
+    """一次 run_agent 的运行记录：回答、工具调用、token 用量与耗时"""
+    answer: Optional[str] = None
+    # 每个工具调用的名称、参数与耗时(毫秒)
+    tool_calls: list = field(default_factory=list)
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # 服务未返回 usage 时 token 数为本地估算；estimated_llm_calls 为其中使用估算的调用次数
+    tokens_estimated: bool = False
+    estimated_llm_calls: int = 0
+    # 第一次 LLM 调用的首 token 延迟与整次运行的耗时(毫秒)
+    ttft_ms: Optional[float] = None
+    elapsed_ms: float = 0
+    error: Optional[str] = None
+
+    def add_usage(self, prompt_tokens: int, completion_tokens: int, estimated: bool, ttft_ms: Optional[float]):
+        self.llm_calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.tokens_estimated = self.tokens_estimated or estimated
+        self.estimated_llm_calls += int(estimated)
+        if self.ttft_ms is None:
+            self.ttft_ms = ttft_ms
+
+
+def tool_result_text(tool_result) -> str:
+    """提取工具调用结果中全部内容项的文本，非文本内容以占位说明代替"""
+    if tool_result is None:
+        return "工具调用失败"
+    parts = []
+    for item in tool_result.content:
+        if item.type == "text":
+            parts.append(item.text)
+        elif item.type == "resource":
+            parts.append(getattr(item.resource, "text", None) or f"[资源 {item.resource.uri}]")
+        else:
+            parts.append(f"[{item.type} {getattr(item, 'mimeType', '')}]")
+    return "\n".join(parts)
+
+
+async def execute_tool_call(mcp_client, tool_call) -> str:
+    """执行单个工具调用，返回结果文本；较大的结果保存为 artifact，只返回标识与预览"""
+    tool_name = tool_call["function"]["name"]
+    # 每个工具调用在各自的任务中执行，设置的 ID 只作用于本次调用的日志
+    tool_call_id_var.set(tool_call.get("id"))
     try:
-        response = llm.chat.completions.create(
-                        model=llm_model_name,
-                        messages=messages,
-                        tools=mcp_client.all_tools,
-                        tool_choice="auto"
+        tool_arguments = json.loads(tool_call["function"]["arguments"] or "{}")
+    except json.JSONDecodeError as e:
+        return f"工具参数解析失败: {e}"
+    with tracer.span("agent.tool", tool=tool_name, tool_call_id=tool_call.get("id")):
+        if artifact_store.is_artifact_tool(tool_name):
+            try:
+                return await asyncio.to_thread(artifact_store.call_tool, tool_name, tool_arguments)
+            except (KeyError, TypeError, ValueError) as e:
+                return f"工具参数错误: {e}"
+        tool_result = await mcp_client.call_mcp_tool(tool_name, tool_arguments)
+        return await asyncio.to_thread(artifact_store.spill, tool_result_text(tool_result))
+
+
+def select_tools(mcp_client, query: str, used_tools) -> list:
+    """按与问题的相关度筛选本次请求携带的工具，并始终包含已经调用过的工具"""
+    if mcp_client.tool_retriever is None:
+        return mcp_client.all_tools
+    tools = mcp_client.tool_retriever.select(query, tool_top_k, used=used_tools)
+    logger.info(f"携带工具 {len(tools)}/{len(mcp_client.all_tools)}，节省约 {mcp_client.tool_retriever.last_tokens_saved} tokens")
+    return tools
+
+
+def make_summarizer(llm):
+    """创建滚动摘要函数：将旧摘要与被移出上下文的消息合并为新的摘要"""
+    async def summarize(previous_summary, messages) -> str:
+        transcript = "\n".join(
+            f"{message['role']}: {message.get('content') or json.dumps(message.get('tool_calls'), ensure_ascii=False)}"
+            for message in messages
+        )
+        prompt = (
+            "请将以下对话内容总结为简洁的要点，保留关键事实、工具调用得到的结论和尚未完成的事项。\n"
+            f"已有摘要：\n{previous_summary or '无'}\n\n新的对话内容：\n{transcript}"
+        )
+        response = await llm.chat.completions.create(
+            model=llm_model_name, messages=[{"role": "user", "content": prompt}]
+        )
+        return response.choices[0].message.content or previous_summary or ""
+    return summarize
+
+
+def create_context_budget(llm) -> ContextBudget:
+    """按环境变量配置创建上下文 token 预算"""
+    return ContextBudget(
+        max_tokens=context_max_tokens,
+        keep_recent=context_keep_recent,
+        preview_tokens=context_preview_tokens,
+        summarizer=make_summarizer(llm) if context_summarize else None,
+    )
+
+
+async def fit_context(context: ContextBudget, messages: list) -> list:
+    """按 token 预算裁剪本次请求的消息并记录 token 数"""
+    request_messages = await context.fit(messages)
+    report = context.last_report
+    logger.info(
+        f"上下文 {report.tokens_after}/{report.budget} tokens (原 {report.tokens_before})，"
+        f"截断 {report.shrunk} 条工具结果，摘要 {report.summarized} 组，丢弃 {report.dropped} 组"
+    )
+    if report.over_budget:
+        logger.warning(f"上下文仍超出预算 {report.tokens_after - report.budget} tokens")
+    return request_messages
+
+
+def print_token(token: str):
+    """将模型输出的token实时写到终端"""
+    sys.stdout.write(token)
+    sys.stdout.flush()
+
+
+async def stream_completion(llm, messages, tools=None, on_token=None, on_tool_call=None,
+                            result: AgentResult = None):
+    """流式调用LLM，边接收边输出文本token；每个工具调用的参数一旦完整即通过 on_tool_call 回调交出
+    传入 result 时将本次调用的 token 用量与首 token 延迟累加到其中
+
+    Returns:
+        tuple: (文本内容, tool_calls 列表, finish_reason)
+    """
+    request = {"model": llm_model_name, "messages": messages, "stream": True}
+    if llm_stream_usage:
+        request["stream_options"] = {"include_usage": True}
+    if tools:
+        request.update(tools=tools, tool_choice="auto")
+    with tracer.span("llm.completion", model=llm_model_name, messages=len(messages), tools=len(tools or [])) as span:
+        start = time.perf_counter()
+        first_token_at = None
+        stream = await llm.chat.completions.create(**request)
+
+        content_parts = []
+        assembler = ToolCallAssembler()
+        finish_reason = None
+        usage = None
+        async for chunk in stream:
+            # 请求了 include_usage 时，服务在最后一个(choices 为空的)chunk 中返回 token 用量
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            choice = chunk.choices[0]
+            delta = choice.delta
+            if delta.content:
+                content_parts.append(delta.content)
+                if on_token is not None:
+                    on_token(delta.content)
+            ready_tool_calls = assembler.add(delta.tool_calls)
+            if on_tool_call is not None:
+                for tool_call in ready_tool_calls:
+                    on_tool_call(tool_call)
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+
+        ready_tool_calls = assembler.finish()
+        if on_tool_call is not None:
+            for tool_call in ready_tool_calls:
+                on_tool_call(tool_call)
+
+        content = "".join(content_parts) or None
+        if tracer.enabled or result is not None:
+            ttft_ms = round((first_token_at - start) * 1000, 3) if first_token_at is not None else None
+            if usage is not None:
+                prompt_tokens, completion_tokens, estimated = usage.prompt_tokens, usage.completion_tokens, False
+            else:
+                prompt_tokens = count_json_tokens(messages)
+                completion_tokens = count_tokens(content or "") + count_json_tokens(assembler.tool_calls)
+                estimated = True
+            span.set(ttft_ms=ttft_ms, finish_reason=finish_reason, tool_calls=len(assembler.tool_calls),
+                     prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                     usage_source="estimate" if estimated else "api")
+            if result is not None:
+                result.add_usage(prompt_tokens, completion_tokens, estimated, ttft_ms)
+    return content, assembler.tool_calls, finish_reason
+
+
+def record_tool_call(result: AgentResult, tool_call: dict, task: asyncio.Task):
+    """在工具调用完成时将其名称、参数与耗时记入 result"""
+    entry = {"name": tool_call["function"]["name"], "arguments": tool_call["function"]["arguments"]}
+    result.tool_calls.append(entry)
+    start = time.perf_counter()
+    task.add_done_callback(lambda _: entry.update(elapsed_ms=round((time.perf_counter() - start) * 1000, 3)))
+
+
+def finish_result(result: Optional[AgentResult], started: float, answer: Optional[str]) -> Optional[str]:
+    if result is not None:
+        result.answer = answer
+        result.elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+    return answer
+
+
+async def run_agent(llm, mcp_client, query, max_steps: int = max_agent_steps, on_token=print_token,
+                    context: ContextBudget = None, result: AgentResult = None, history: list = None):
+    """运行Agent：反复调用工具直到模型给出最终回答，或达到 max_steps 轮次上限
+
+    Args:
+        llm (AsyncOpenAI): 异步LLM客户端
+        mcp_client (MCPClient): 已连接的MCP客户端
+        query (str): 用户问题
+        max_steps (int): 最多进行的工具调用轮数，达到上限后再调用一次LLM(不带工具)生成最终回答
+        on_token (callable): 接收流式文本token的回调，为 None 时不输出
+        context (ContextBudget): 消息历史的 token 预算，默认按环境变量创建
+        result (AgentResult): 传入时记录本次运行的回答、工具调用、token 用量与耗时
+        history (list): 同一会话此前的消息，本次的问题、工具调用与回答会追加到其中；为 None 时为单轮对话
+
+    Returns:
+        str: 模型的最终回答，出错时返回 None
+    """
+    request_id = new_request_id()
+    messages = history if history is not None else []
+    messages.append({"role": "user", "content": query})
+    used_tools = []
+    # 对话中出现 artifact 后才携带读取 artifact 的内置工具；延续的会话历史中已有的 artifact 同样计入
+    has_artifacts = any(
+        message.get("role") == "tool" and HANDLE_PREFIX in (message.get("content") or "") for message in messages
+    )
+    if context is None:
+        context = create_context_budget(llm)
+    started = time.perf_counter()
+    with tracer.span("agent.turn", request_id=request_id):
+        try:
+            for step in range(max_steps):
+                # 参数完整的工具调用立即开始执行，与模型继续生成其余内容重叠
+                pending = {}
+                def dispatch(tool_call):
+                    task = asyncio.create_task(execute_tool_call(mcp_client, tool_call))
+                    pending[id(tool_call)] = task
+                    if result is not None:
+                        record_tool_call(result, tool_call, task)
+
+                try:
+                    content, tool_calls, finish_reason = await stream_completion(
+                        llm, await fit_context(context, messages),
+                        tools=select_tools(mcp_client, query, used_tools) + (ARTIFACT_TOOLS if has_artifacts else []),
+                        on_token=on_token, on_tool_call=dispatch, result=result
                     )
-        response_content = response.choices[0]
-        response_message = response_content.message
-        if response_content.finish_reason == "tool_calls":
-            tool_calls = response_message.tool_calls
-            for tool_call in tool_calls:
-                tool_name = tool_call.function.name
-                tool_arguments = json.loads(tool_call.function.arguments)
-                
-                tool_result = await mcp_client.call_mcp_tool(tool_name, tool_arguments)
-                messages.extend([
-                    {
-                        "role": "assistant",
-                        "content": None,
-                        "tool_calls": [tool_call]
-                    },
-                    {
+                except BaseException:
+                    for task in pending.values():
+                        task.cancel()
+                    raise
+                if not tool_calls:
+                    logger.debug(f"🤖 model: {content}")
+                    messages.append({"role": "assistant", "content": content or ""})
+                    return finish_result(result, started, content)
+
+                logger.info(f"第 {step + 1} 轮工具调用: {[tool_call['function']['name'] for tool_call in tool_calls]}")
+                used_tools.extend(tool_call["function"]["name"] for tool_call in tool_calls)
+                tool_results = await asyncio.gather(*[pending[id(tool_call)] for tool_call in tool_calls])
+                # 工具结果齐全后才写入历史，运行被取消时会话历史中不会留下没有结果的 tool_calls
+                messages.append({
+                    "role": "assistant",
+                    "content": content,
+                    "tool_calls": tool_calls
+                })
+                has_artifacts = has_artifacts or any(HANDLE_PREFIX in tool_result for tool_result in tool_results)
+                for tool_call, tool_result in zip(tool_calls, tool_results):
+                    messages.append({
                         "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": tool_result.content[0].text
-                    }
-                ])
-            final_response = llm.chat.completions.create(
-                model=llm_model_name,
-                messages=messages
-            )
-            logger.info(f"\n🤖 model: {final_response.choices[0].message.content}")
-        else:
-            logger.info(f"\n🤖 model: {response_message.content}")
-    except Exception as e:
-        logger.error(f"Agent 运行错误: {e}")
+                        "tool_call_id": tool_call["id"],
+                        "content": tool_result
+                    })
+
+            # 达到轮次上限，不再提供工具，要求模型直接回答
+            logger.warning(f"已达到最大轮次 {max_steps}，生成最终回答")
+            content, _, _ = await stream_completion(llm, await fit_context(context, messages), on_token=on_token,
+                                                    result=result)
+            logger.debug(f"🤖 model: {content}")
+            messages.append({"role": "assistant", "content": content or ""})
+            return finish_result(result, started, content)
+        except Exception as e:
+            logger.error(f"Agent 运行错误: {e}")
+            if result is not None:
+                result.error = f"{type(e).__name__}: {e}"
+            return finish_result(result, started, None)
 
 
 async def main(servers_list):
-    llm = OpenAI(api_key=api_key, base_url=base_url)
+    llm = AsyncOpenAI(api_key=api_key, base_url=base_url)
 
-    mcp_client = MCPClient()
+    mcp_client = MCPClient(cache_ttls=tool_cache_ttls)
 
     await mcp_client.connect_to_servers(servers_list)
 
+    # 多轮对话的消息历史保存在检查点中(默认 SQLite 文件)，设置 CONVERSATION_ID 可在重启后继续同一会话
+    checkpointer = create_memory()
+    conversation_id = os.getenv("CONVERSATION_ID") or uuid.uuid4().hex
+    history = await load_history(checkpointer, conversation_id)
+    context = create_context_budget(llm)
+    logger.info(f"会话 {conversation_id}，已有 {len(history)} 条消息")
+
     # client循环对话
     while True:
-        user_input = input("User: ")
+        # input() 放到线程中执行，等待输入时不阻塞事件循环
+        user_input = await asyncio.to_thread(input, "User: ")
         
         if user_input in ['quit', '退出']:
             break
         
-        await run_agent(llm, mcp_client, user_input)
+        print("\n🤖 model: ", end="", flush=True)
+        result = AgentResult()
+        loaded = len(history)
+        await run_agent(llm, mcp_client, user_input, context=context, result=result, history=history)
+        print()
+        if result.error is None:
+            await save_history(checkpointer, conversation_id, history)
+        else:
+            # 出错的一轮不保留，避免历史中留下没有回答的问题
+            del history[loaded:]
     
     await mcp_client.cleanup()
+    # SqliteSaver 持有数据库连接，MemorySaver 无需关闭
+    if hasattr(checkpointer, "close"):
+        checkpointer.close()
 
 
 if __name__ == "__main__":
     
     os.chdir(os.path.dirname(__file__))
     
-    servers_list = {
-        "exec_py": "./mcp_servers/python/exec_py.py",
-        "search_bing": "./mcp_servers/python/search_bing.py",
-        "exec_js": "./mcp_servers/js/exec_js.js"
-    }
     asyncio.run(main(servers_list))
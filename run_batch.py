@@ -0,0 +1,173 @@
+"""
+批量(无交互)运行 Agent
+
+从 JSONL 文件或标准输入读取问题，每行一个 JSON 对象 {"id": ..., "query": ...}(id 可省略，默认为行号)，
+使用共享的 MCPClient 与 LLM 客户端，由固定数量的 worker 并发执行，
+每完成一个问题即向输出文件追加一行 JSON 结果(回答、工具调用、耗时与 token 用量)，顺序为完成顺序。
+--resume 时跳过输出文件中已成功完成的问题，可在中断后继续。
+
+用法:
+    python run_batch.py queries.jsonl -o results.jsonl [--workers 4] [--resume]
+    cat queries.jsonl | python run_batch.py - -o results.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from dataclasses import asdict
+from typing import Optional, Set
+
+from openai import AsyncOpenAI
+
+from MCP_StdioClient_2 import MCPClient
+from common.logger import logger
+from run import AgentResult, api_key, base_url, max_agent_steps, run_agent, servers_list, tool_cache_ttls
+
+# 各 worker 待处理问题队列的长度，读取速度受处理速度约束，不会一次读入全部输入
+QUEUE_SIZE_PER_WORKER = 2
+
+
+def load_completed(output_path: str) -> Set[str]:
+    """读取已有的输出文件，返回已成功完成的问题 id；截掉中断时写了一半的最后一行"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "rb+") as file:
+        data = file.read()
+        valid_end = data.rfind(b"\n") + 1
+        if valid_end < len(data):
+            logger.warning(f"输出文件末尾有不完整的记录，已截断 {len(data) - valid_end} 字节")
+            file.truncate(valid_end)
+    for line in data[:valid_end].decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(record, dict) and "id" in record and record.get("error") is None:
+            completed.add(str(record["id"]))
+    return completed
+
+
+def parse_query(line: str, line_number: int) -> Optional[dict]:
+    """解析一行输入；空行返回 None，不是含非空 query 的记录时抛出 ValueError"""
+    line = line.strip()
+    if not line:
+        return None
+    item = json.loads(line)
+    if isinstance(item, str):
+        item = {"query": item}
+    if not isinstance(item, dict):
+        raise ValueError("应为 JSON 对象或字符串")
+    query = item.get("query")
+    if not isinstance(query, str) or not query.strip():
+        raise ValueError("缺少非空的 query 字段")
+    item.setdefault("id", line_number)
+    item["id"] = str(item["id"])
+    return item
+
+
+async def read_queries(input_file, queue: asyncio.Queue, completed: Set[str], workers: int) -> int:
+    """逐行读取问题放入队列(文件读取在线程中进行)，读完后为每个 worker 放入结束标记"""
+    skipped = 0
+    line_number = 0
+    try:
+        while True:
+            line = await asyncio.to_thread(input_file.readline)
+            if not line:
+                break
+            line_number += 1
+            try:
+                item = parse_query(line, line_number)
+            except ValueError as e:
+                logger.error(f"第 {line_number} 行不是合法的问题记录，已跳过: {e}")
+                continue
+            if item is None:
+                continue
+            if item["id"] in completed:
+                skipped += 1
+                continue
+            await queue.put(item)
+    finally:
+        for _ in range(workers):
+            await queue.put(None)
+    return skipped
+
+
+async def worker(llm, mcp_client, queue: asyncio.Queue, output, max_steps: int, counters: dict):
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        result = AgentResult()
+        try:
+            await run_agent(llm, mcp_client, item["query"], max_steps=max_steps, on_token=None, result=result)
+        except Exception as e:
+            # 单个问题出错只记为失败，不中断整批运行
+            logger.error(f"[{item['id']}] 运行失败: {e}")
+            result.error = f"{type(e).__name__}: {e}"
+        record = {"id": item["id"], "query": item["query"], **asdict(result)}
+        # 单线程事件循环中逐行写入并刷新，中断时最多丢失正在执行的问题
+        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
+        counters["failed" if result.error is not None or result.answer is None else "done"] += 1
+        counters["prompt_tokens"] += result.prompt_tokens
+        counters["completion_tokens"] += result.completion_tokens
+        counters["llm_calls"] += result.llm_calls
+        counters["estimated_llm_calls"] += result.estimated_llm_calls
+        logger.info(f"[{item['id']}] 完成，耗时 {result.elapsed_ms / 1000:.2f}s，"
+                    f"工具调用 {len(result.tool_calls)} 次，tokens {result.prompt_tokens}+{result.completion_tokens}")
+
+
+async def run_batch(input_file, output_path: str, workers: int, resume: bool, max_steps: int):
+    completed = load_completed(output_path) if resume else set()
+    if completed:
+        logger.info(f"已完成 {len(completed)} 个问题，将跳过")
+
+    llm = AsyncOpenAI(api_key=api_key, base_url=base_url)
+    mcp_client = MCPClient(cache_ttls=tool_cache_ttls)
+    await mcp_client.connect_to_servers(servers_list)
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * QUEUE_SIZE_PER_WORKER)
+    counters = {"done": 0, "failed": 0, "prompt_tokens": 0, "completion_tokens": 0, "llm_calls": 0,
+                "estimated_llm_calls": 0}
+    start = time.perf_counter()
+    try:
+        with open(output_path, "a" if resume else "w", encoding="utf-8") as output:
+            reader = asyncio.create_task(read_queries(input_file, queue, completed, workers))
+            await asyncio.gather(*[
+                worker(llm, mcp_client, queue, output, max_steps, counters) for _ in range(workers)
+            ])
+            skipped = await reader
+    finally:
+        await mcp_client.cleanup()
+        await llm.close()
+    logger.info(f"批量运行结束：完成 {counters['done']}，失败 {counters['failed']}，跳过 {skipped}，"
+                f"耗时 {time.perf_counter() - start:.1f}s，tokens {counters['prompt_tokens']}+{counters['completion_tokens']}"
+                + (f"(LLM 调用 {counters['llm_calls']} 次，其中 {counters['estimated_llm_calls']} 次为估算)"
+                   if counters["estimated_llm_calls"] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="问题文件(JSONL)，- 表示标准输入")
+    parser.add_argument("-o", "--output", required=True, help="结果文件(JSONL)")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="同时运行的问题数")
+    parser.add_argument("--resume", action="store_true", help="跳过输出文件中已成功完成的问题，并追加写入")
+    parser.add_argument("--max-steps", type=int, default=max_agent_steps, help="每个问题最多的工具调用轮数(之后再调用一次 LLM 生成最终回答)")
+    args = parser.parse_args()
+
+    # server 脚本路径相对于本文件所在目录，切换目录前先将输入输出路径转为绝对路径
+    output_path = os.path.abspath(args.output)
+    input_file = sys.stdin if args.input == "-" else open(os.path.abspath(args.input), encoding="utf-8")
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        asyncio.run(run_batch(input_file, output_path, args.workers, args.resume, args.max_steps))
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+
+
+if __name__ == "__main__":
+    main()
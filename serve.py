@@ -0,0 +1,275 @@
+"""
+Agent HTTP 服务
+
+以 HTTP/SSE 接口提供 run_agent，所有请求共享一组 MCP server 连接与一个带连接池的 LLM 客户端，
+进程数与内存随负载增长，而不是随用户数增长。
+
+接口:
+    POST   /v1/agent                     {"query": "...", "conversation_id": "可选", "stream": true}
+           stream 为 true(默认)时以 SSE 返回 start / token 事件，以 done(成功)或 error(出错)事件结束，
+           否则返回 JSON 结果(出错时状态码为 500)
+    DELETE /v1/conversations/{id}        删除会话
+    GET    /health                       运行状态(进行中与排队的请求数、会话数、server 启动情况)
+
+同时运行的 Agent 数不超过 SERVE_MAX_INFLIGHT，超出时排队；排队数超过 SERVE_MAX_QUEUE
+或排队超过 SERVE_QUEUE_TIMEOUT 秒时返回 503。同一会话同时只能有一个请求，否则返回 409。
+会话历史保存在 SQLite 文件(SERVE_HISTORY_DB)中并在每次请求时加载，每个会话最多保留
+SERVE_MAX_HISTORY_MESSAGES 条消息，内存占用不随会话数与对话轮数增长。
+
+用法:
+    python serve.py [--host 127.0.0.1] [--port 8000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+
+import httpx
+import uvicorn
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from MCP_StdioClient_2 import MCPClient
+from common.logger import logger
+from memory.conversation_history import ConversationHistory
+from run import AgentResult, api_key, base_url, create_context_budget, run_agent, servers_list, tool_cache_ttls
+
+# 同时运行的 Agent 数量上限
+serve_max_inflight = int(os.getenv("SERVE_MAX_INFLIGHT", "16"))
+# 等待运行的请求数量上限，超出时直接返回 503
+serve_max_queue = int(os.getenv("SERVE_MAX_QUEUE", "64"))
+# 请求最长排队时间(秒)
+serve_queue_timeout = float(os.getenv("SERVE_QUEUE_TIMEOUT", "30"))
+# 会话历史数据库路径，':memory:' 表示不落盘
+serve_history_db = os.getenv("SERVE_HISTORY_DB", os.path.join("data", "conversations.sqlite"))
+# 每个会话保留的消息数量
+serve_max_history_messages = int(os.getenv("SERVE_MAX_HISTORY_MESSAGES", "100"))
+# 保留的会话数量上限与会话空闲过期时间(秒)
+serve_max_conversations = int(os.getenv("SERVE_MAX_CONVERSATIONS", "1000"))
+serve_conversation_ttl = float(os.getenv("SERVE_CONVERSATION_TTL", "3600"))
+# 单个 MCP server 同时执行的工具调用数量上限(所有请求共享)
+serve_max_concurrency_per_server = int(os.getenv("SERVE_MAX_CONCURRENCY_PER_SERVER", "8"))
+
+MAX_CONVERSATION_ID_LENGTH = 128
+
+
+class Overloaded(Exception):
+    """排队已满或排队超时"""
+
+
+class AdmissionController:
+    """限制同时运行的 Agent 数量，超出的请求有界排队"""
+
+    def __init__(self, max_inflight: int, max_queue: int, queue_timeout: float):
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_inflight)
+        self.inflight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def acquire(self):
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("排队请求已满")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded(f"排队超过 {self.queue_timeout}s")
+        finally:
+            self.waiting -= 1
+        self.inflight += 1
+
+    def release(self):
+        self.inflight -= 1
+        self._semaphore.release()
+
+
+class ConversationStore:
+    """会话历史保存在 SQLite 中，每次请求时加载；内存中只记录正在运行的会话"""
+
+    def __init__(self, history: ConversationHistory, max_conversations: int, ttl: float):
+        self.history = history
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self._busy: set = set()
+
+    def try_acquire(self, conversation_id: str) -> bool:
+        """标记会话正在运行，会话已有进行中的请求时返回 False"""
+        if conversation_id in self._busy:
+            return False
+        self._busy.add(conversation_id)
+        return True
+
+    def release(self, conversation_id: str):
+        self._busy.discard(conversation_id)
+
+    async def load(self, conversation_id: str) -> list:
+        return await self.history.aload(conversation_id)
+
+    async def save(self, conversation_id: str, messages: list, created: bool):
+        """追加本轮新增的消息；新建会话时顺带移除过期或超出数量上限的会话(正在运行的除外)"""
+        await self.history.aappend(conversation_id, messages)
+        if created:
+            await self.history.aexpire(self.max_conversations, self.ttl, keep=set(self._busy))
+
+    async def delete(self, conversation_id: str) -> bool:
+        if conversation_id in self._busy:
+            return False
+        return await self.history.adelete(conversation_id)
+
+    async def count(self) -> int:
+        return await self.history.acount()
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def run_conversation(app_state, conversation_id: str, query: str, events: asyncio.Queue) -> AgentResult:
+    """运行一轮对话，结束时总会放入一个终止事件：成功为 done，出错为 error"""
+    result = AgentResult()
+    try:
+        # 历史每次从数据库重新加载，token 预算也按请求创建
+        history = await app_state.conversations.load(conversation_id)
+        loaded = len(history)
+        await run_agent(
+            app_state.llm, app_state.mcp_client, query,
+            on_token=lambda token: events.put_nowait(("token", {"text": token})),
+            context=create_context_budget(app_state.llm), result=result, history=history,
+        )
+        # run_agent 已先把问题追加到 history；只有正常完成(没有错误)时才写入本轮消息，
+        # 出错、抛出异常或被取消时会话历史保持不变，不会留下没有回答的问题
+        if result.error is None:
+            await app_state.conversations.save(conversation_id, history[loaded:], created=loaded == 0)
+    except Exception as e:
+        logger.error(f"会话 {conversation_id} 运行失败: {e}")
+        result.error = f"{type(e).__name__}: {e}"
+    events.put_nowait(("error" if result.error is not None else "done",
+                       {"conversation_id": conversation_id, **asdict(result)}))
+    return result
+
+
+async def agent_endpoint(request: Request):
+    state = request.app.state
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        return JSONResponse({"error": "请求体不是合法的 JSON"}, status_code=400)
+    query = body.get("query") if isinstance(body, dict) else None
+    conversation_id = body.get("conversation_id") if isinstance(body, dict) else None
+    if not isinstance(query, str) or not query.strip():
+        return JSONResponse({"error": "缺少 query"}, status_code=400)
+    if conversation_id is not None and (not isinstance(conversation_id, str)
+                                        or len(conversation_id) > MAX_CONVERSATION_ID_LENGTH):
+        return JSONResponse({"error": "conversation_id 无效"}, status_code=400)
+
+    conversation_id = conversation_id or uuid.uuid4().hex
+    if not state.conversations.try_acquire(conversation_id):
+        return JSONResponse({"error": "该会话已有进行中的请求", "conversation_id": conversation_id}, status_code=409)
+    try:
+        await state.admission.acquire()
+    except Overloaded as e:
+        state.conversations.release(conversation_id)
+        return JSONResponse({"error": f"服务繁忙: {e}"}, status_code=503, headers={"Retry-After": "1"})
+
+    events: asyncio.Queue = asyncio.Queue()
+    task = asyncio.create_task(run_conversation(state, conversation_id, query, events))
+
+    def on_done(_):
+        # 名额与会话随 Agent 任务结束释放，与客户端是否读取响应无关
+        state.admission.release()
+        state.conversations.release(conversation_id)
+
+    task.add_done_callback(on_done)
+
+    if not body.get("stream", True):
+        result = await task
+        return JSONResponse({"conversation_id": conversation_id, **asdict(result)},
+                            status_code=500 if result.error is not None else 200)
+
+    async def stream():
+        try:
+            yield sse_event("start", {"conversation_id": conversation_id})
+            while True:
+                event, data = await events.get()
+                yield sse_event(event, data)
+                if event in ("done", "error"):
+                    break
+        finally:
+            # 客户端断开时取消仍在运行的 Agent
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+async def delete_conversation(request: Request):
+    conversation_id = request.path_params["conversation_id"]
+    if not await request.app.state.conversations.delete(conversation_id):
+        return JSONResponse({"error": "会话不存在或正在运行"}, status_code=404)
+    return JSONResponse({"deleted": conversation_id})
+
+
+async def health(request: Request):
+    state = request.app.state
+    return JSONResponse({
+        "inflight": state.admission.inflight,
+        "waiting": state.admission.waiting,
+        "rejected": state.admission.rejected,
+        "conversations": await state.conversations.count(),
+        "servers": state.mcp_client.startup_report,
+    })
+
+
+def create_app(servers: dict = None) -> Starlette:
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        # LLM 客户端的连接池按并发上限配置，所有请求复用连接
+        http_client = DefaultAsyncHttpxClient(limits=httpx.Limits(
+            max_connections=serve_max_inflight * 2, max_keepalive_connections=serve_max_inflight
+        ))
+        app.state.llm = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+        app.state.mcp_client = MCPClient(max_concurrency_per_server=serve_max_concurrency_per_server,
+                                         cache_ttls=tool_cache_ttls)
+        await app.state.mcp_client.connect_to_servers(servers or servers_list)
+        app.state.admission = AdmissionController(serve_max_inflight, serve_max_queue, serve_queue_timeout)
+        history = ConversationHistory(serve_history_db, max_messages=serve_max_history_messages)
+        app.state.conversations = ConversationStore(history, serve_max_conversations, serve_conversation_ttl)
+        logger.info(f"Agent 服务已启动，同时运行上限 {serve_max_inflight}，排队上限 {serve_max_queue}")
+        try:
+            yield
+        finally:
+            await app.state.mcp_client.cleanup()
+            await app.state.llm.close()
+            history.close()
+
+    return Starlette(routes=[
+        Route("/v1/agent", agent_endpoint, methods=["POST"]),
+        Route("/v1/conversations/{conversation_id}", delete_conversation, methods=["DELETE"]),
+        Route("/health", health, methods=["GET"]),
+    ], lifespan=lifespan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    # server 脚本路径相对于本文件所在目录
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    uvicorn.run(create_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()